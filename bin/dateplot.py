@@ -12,6 +12,7 @@ DESCRIPTION:
     Input is two columns. Unless --basic is specified, the first column is a
     datetime, and the second column is a value. --basic turns on the basic 
     x.y plot mode, where the first column is just x, and the second column is y.
+    With --key, a third column names the series each row belongs to.
 
 AUTHOR:
 
@@ -52,6 +53,41 @@ EXAMPLES:
         | awk '{print $2,$1}' \
         dateplot.py --minute --large
 
+    # or let dateplot do the counting: one row per ERROR line, counted per
+    # minute. --agg also takes sum, mean, min, max, median and pNN, e.g. p99
+    cat logfile \
+        | grep ERROR \
+        | perl -nE'/(2018-\d\d-\d\dT\d\d:\d\d:\d\d)/ and say "$1 1"' \
+        | dateplot.py --minute --agg count
+
+    # p99 latency per 5 minutes
+    dateplot.py --resample 5min --agg p99 latency.txt
+
+    # error counts per host, one line per host for the 5 busiest hosts
+    # input lines are "<timestamp> 1 <host>"
+    dateplot.py --key --top 5 --minute --agg count errors.txt
+
+    # the same, one subplot per host, or one line per input file
+    dateplot.py --key --facet --minute --agg count errors.txt
+    dateplot.py --by-file --minute --agg count web1.txt web2.txt
+
+    # one chart per host file, in one process, into /tmp/charts/<host>.png
+    dateplot.py --batch /tmp/charts --minute --agg count logs/*.txt
+
+Series:
+    --key reads a third column, and --by-file uses the input file name instead.
+    Each key becomes its own series, aggregated and downsampled on its own.
+    Only the --top keys with the largest totals are drawn (default 10), as
+    overlaid lines with a legend, or with --facet one subplot per key. With
+    --batch and --key, each key gets a chart of its own.
+
+Aggregation and downsampling:
+    --month, --day, --hour and --minute (when given), or --resample RULE with
+    any pandas offset alias, aggregate the values per period with --agg
+    (default sum) before plotting. Whatever is left is then downsampled with
+    Largest-Triangle-Three-Buckets to at most one point per pixel of the
+    chart width (see --max-points), which keeps the shape of the series.
+
 Date/Time parsing:
     A few date+time formats are understood 
     YYYY-MM-DDTHH:MM:SS
@@ -60,6 +96,18 @@ Date/Time parsing:
     HH:MM:SS (today)
     HH:MM  (today)
 
+    For large inputs, give the format explicitly with --date-format so the
+    whole column is parsed in one vectorized pass, e.g.
+    --date-format "%Y-%m-%d %H:%M:%S". CSV and TSV input is read with the
+    pyarrow engine when pyarrow is installed.
+
+
+Output:
+    The chart is written to --outfile and opened in the desktop's viewer (open
+    on macOS, xdg-open on Linux), unless --no-open is given or there is no
+    display, in which case matplotlib draws with the Agg backend. pandas and
+    matplotlib are only imported once there is something to plot.
+
 
 from python:
 
@@ -68,22 +116,30 @@ from python:
 
     # dateplot.run(opts)
     df = dateplot.get_data(opts)
+    df = dateplot.aggregate(df, opts)
+    df = dateplot.top_keys(df, opts)
     dateplot.plot(df, opts)
 
 There are a lot of options so that it can be quickly used for a variety of stuff.
 
 """
 
-from io import StringIO
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING
 
 import argparse
-import fileinput
+import importlib.util
 import logging
-import os
+import re
 import sys
 
-import matplotlib.pyplot as plt
-import pandas as pd
+import plotting
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
 
 
 cf0 = "{:,.0f}".format
@@ -92,6 +148,18 @@ cf2 = "{:,.2f}".format
 
 TIMESTAMP_FORMAT = "%(asctime)s %(levelname)s - %(message)s"
 
+# pandas offset aliases for the precision flags, in get_date_output() order
+PERIOD_RULES = {"day": "D", "month": "MS", "hour": "60min", "minute": "min"}
+AGGREGATIONS = ["sum", "mean", "min", "max", "median", "count"]
+
+
+def aggregation(value):
+    if value in AGGREGATIONS or re.match(r"^p\d+(\.\d+)?$", value):
+        return value
+    raise argparse.ArgumentTypeError(
+        f"{value} is not one of {', '.join(AGGREGATIONS)} or a percentile like p99"
+    )
+
 
 def parse_args(args=None):
     desc = ""
@@ -110,19 +178,75 @@ def parse_args(args=None):
         help="input is tab separated. Otherwise, whitespace is assumed",
     )
     p.add_argument(
-        "--month", "-m", action="store_true", help="output date with month precision"
+        "--date-format",
+        "-F",
+        help='strptime format of the input dates, e.g. "%%Y-%%m-%%d %%H:%%M:%%S". '
+        "Otherwise the format is inferred",
+    )
+    p.add_argument(
+        "--engine",
+        choices=["c", "pyarrow", "python"],
+        help="pandas parser engine. default: pyarrow for csv/tsv if installed, "
+        "otherwise c",
+    )
+    p.add_argument(
+        "--month", "-m", action="store_true", help="aggregate and label dates per month"
     )
     p.add_argument(
-        "--day", "-d", action="store_true", help="output date with day precision"
+        "--day", "-d", action="store_true", help="aggregate and label dates per day"
     )
     p.add_argument(
         "--hour",
         "-H",
         action="store_true",
-        help="output date with hour precision. This is the default",
+        help="aggregate and label dates per hour. Without a precision flag, "
+        "nothing is aggregated and dates are labeled to the hour",
+    )
+    p.add_argument(
+        "--minute", "-M", action="store_true", help="aggregate and label dates per minute"
+    )
+    p.add_argument(
+        "--resample",
+        "-R",
+        metavar="RULE",
+        help="aggregate per period given as a pandas offset alias, e.g. 5min, 1h, D",
+    )
+    p.add_argument(
+        "--agg",
+        "-A",
+        type=aggregation,
+        default="sum",
+        help="aggregation for --resample and the precision flags: "
+        "sum, mean, min, max, median, count or pNN. default=%(default)s",
+    )
+    p.add_argument(
+        "--max-points",
+        type=int,
+        help="downsample to at most this many points. 0 plots every point. "
+        "default: the chart width in pixels",
+    )
+    series = p.add_mutually_exclusive_group()
+    series.add_argument(
+        "--key",
+        "-k",
+        action="store_true",
+        help="a third column names the series of each row",
+    )
+    series.add_argument(
+        "--by-file",
+        action="store_true",
+        help="one series per input file",
+    )
+    p.add_argument(
+        "--top",
+        type=int,
+        help="plot the TOP keys with the largest totals. default: 10, "
+        "or every key with --batch",
     )
     p.add_argument(
-        "--minute", "-M", action="store_true", help="output date with minute precision."
+        "--facet",
+        action="store_true",
+        help="one subplot per key, rather than overlaid lines",
     )
     p.add_argument(
         "--output-date-format",
@@ -149,6 +273,18 @@ def parse_args(args=None):
         help="output file. default=%(default)s",
         default="/tmp/dateplot.png",
     )
+    p.add_argument(
+        "--batch",
+        metavar="FOLDER",
+        help="write one chart per input file, or per key with --key, to "
+        "FOLDER/<name>.png, in one process",
+    )
+    p.add_argument(
+        "--no-open",
+        "-n",
+        action="store_true",
+        help="don't open the chart in a viewer",
+    )
     p.add_argument("--symbol", "-s", help='alternate symbol, e.g. "*" for chart')
     p.add_argument("--title", "-T", help="title for the chart")
 
@@ -179,16 +315,32 @@ def parse_args(args=None):
     # syntax.
     if args is None:
         args = sys.argv[1:]
-    return p.parse_args(args)
+    opts = p.parse_args(args)
+    if opts.batch and not opts.input:
+        p.error("--batch needs input files")
+    return opts
 
 
-def get_data(opts: argparse.Namespace) -> pd.DataFrame:
+def choose_engine(opts: argparse.Namespace, sep: str) -> str:
+    if opts.engine:
+        return opts.engine
+    # pyarrow only takes single character separators
+    if len(sep) == 1 and importlib.util.find_spec("pyarrow"):
+        return "pyarrow"
+    return "c"
+
+
+def read_source(source, opts: argparse.Namespace) -> pd.DataFrame:
+    import pandas as pd
+
     args = {
         "names": ["datetime", "val"],
         "sep": r"\s+",
+        "dtype": {"val": "float64"},
     }
-    if not opts.basic:
-        args["parse_dates"] = ["datetime"]
+    if opts.key:
+        args["names"].append("key")
+        args["dtype"]["key"] = "str"
 
     if opts.tsv:
         args["sep"] = "\t"
@@ -196,8 +348,24 @@ def get_data(opts: argparse.Namespace) -> pd.DataFrame:
     elif opts.csv:
         args["sep"] = ","
 
-    indata = StringIO("".join([s for s in fileinput.input(opts.input)]))
-    df = pd.read_table(indata, **args)
+    args["engine"] = choose_engine(opts, args["sep"])
+    logging.debug("engine: %s", args["engine"])
+
+    # files go straight to pandas, rather than through one big string
+    df = pd.read_table(sys.stdin if source == "-" else source, **args)
+
+    if not opts.basic:
+        df["datetime"] = pd.to_datetime(df["datetime"], format=opts.date_format)
+    if opts.by_file:
+        df["key"] = Path(source).name
+    return df
+
+
+def get_data(opts: argparse.Namespace) -> pd.DataFrame:
+    import pandas as pd
+
+    frames = [read_source(source, opts) for source in opts.input or ["-"]]
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
 
     logging.debug(df.head())
     logging.debug("dtype: %s", df.dtypes)
@@ -206,6 +374,112 @@ def get_data(opts: argparse.Namespace) -> pd.DataFrame:
     return df
 
 
+def top_keys(df: pd.DataFrame, opts: argparse.Namespace) -> pd.DataFrame:
+    """keep the rows of the keys with the largest totals, biggest first"""
+    if "key" not in df:
+        return df
+    limit = opts.top
+    if limit is None and not opts.batch:
+        limit = 10
+    totals = df.groupby("key", sort=False)["val"].sum().sort_values(ascending=False)
+    if limit is not None and len(totals) > limit:
+        logging.info("plotting %d of %d keys", limit, len(totals))
+        totals = totals.iloc[:limit]
+    order = {key: n for n, key in enumerate(totals.index)}
+    df = df[df["key"].isin(order)]
+    return df.sort_values("key", key=lambda keys: keys.map(order), kind="stable")
+
+
+def series(df: pd.DataFrame) -> list[tuple[str | None, pd.DataFrame]]:
+    if "key" not in df:
+        return [(None, df)]
+    return [(key, group) for key, group in df.groupby("key", sort=False)]
+
+
+def resample_rule(opts):
+    if opts.resample:
+        return opts.resample
+    for period, rule in PERIOD_RULES.items():
+        if getattr(opts, period):
+            return rule
+    return None
+
+
+def aggregate(df: pd.DataFrame, opts: argparse.Namespace) -> pd.DataFrame:
+    """aggregate val per period, if one was asked for"""
+    rule = resample_rule(opts)
+    if rule is None:
+        return df
+    if opts.basic:
+        logging.warning("no aggregation in --basic mode, the x values are not dates")
+        return df
+
+    if "key" in df:
+        # every key's periods in one groupby, rather than a resample per key
+        import pandas as pd
+
+        periods = df.groupby(["key", pd.Grouper(key="datetime", freq=rule)])["val"]
+    else:
+        periods = df.set_index("datetime")["val"].resample(rule)
+    percentile = re.match(r"^p(\d+(\.\d+)?)$", opts.agg)
+    if percentile:
+        out = periods.quantile(float(percentile.group(1)) / 100)
+    else:
+        out = periods.agg(opts.agg)
+    logging.debug("%s per %s: %d rows from %d", opts.agg, rule, len(out), len(df))
+    return out.rename("val").reset_index()
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Indexes of the points kept by Largest-Triangle-Three-Buckets. The first
+    and last points are kept, and from each bucket in between the point that
+    makes the largest triangle with the previous kept point and the average
+    of the next bucket.
+    """
+    import numpy as np
+
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def downsample(df: pd.DataFrame, max_points: int) -> pd.DataFrame:
+    import pandas as pd
+
+    if not max_points or len(df) <= max_points:
+        return df
+    x = df["datetime"]
+    if pd.api.types.is_datetime64_any_dtype(x):
+        x = x.astype("int64")
+    elif not pd.api.types.is_numeric_dtype(x):
+        return df
+
+    df = df.assign(_x=x).dropna().sort_values("_x", kind="stable")
+    keep = lttb(
+        df["_x"].to_numpy(dtype=float), df["val"].to_numpy(dtype=float), max_points
+    )
+    logging.debug("downsampled %d points to %d", len(df), len(keep))
+    return df.iloc[keep].drop(columns="_x")
+
+
 def get_date_output(opts):
     if opts.day:
         fmt = "%Y-%m-%d"
@@ -231,33 +505,95 @@ def plot(df, opts):
     if opts.y:
         dims[1] = opts.y
 
-    fig = plt.figure()
-    ax = fig.add_subplot(111)
-    ax.plot(df["datetime"], df["val"], opts.points)
+    lines = series(df)
+    plt = plotting.pyplot()
+    if opts.facet and len(lines) > 1:
+        dims[1] = max(dims[1], 2 * len(lines))
+        fig, axes = plt.subplots(len(lines), 1, sharex=True, squeeze=False)
+        axes = axes[:, 0]
+    else:
+        fig = plt.figure()
+        axes = [fig.add_subplot(111)] * len(lines)
+    max_points = opts.max_points
+    if max_points is None:
+        max_points = int(dims[0] * fig.dpi)
+
+    for ax, (key, line) in zip(axes, lines):
+        line = downsample(line, max_points)
+        ax.plot(line["datetime"], line["val"], opts.points, label=key)
+        if key is not None and opts.facet:
+            ax.set_title(key, fontsize="small")
+    if len(lines) > 1 and not opts.facet:
+        axes[0].legend(fontsize="small")
     date_format = get_date_output(opts)
 
     if not opts.basic:
         import matplotlib.dates as mdates
 
-        ax.xaxis.set_major_formatter(mdates.DateFormatter(date_format))
+        for ax in set(axes):
+            ax.xaxis.set_major_formatter(mdates.DateFormatter(date_format))
         # rotate and align the tick labels so they look better
         fig.autofmt_xdate(rotation=opts.rotation, bottom=0.3)
 
     if opts.title:
-        plt.title(opts.title)
+        fig.suptitle(opts.title)
 
     fig.set_size_inches(w=dims[0], h=dims[1])
-    plt.savefig(opts.outfile)
+    fig.savefig(opts.outfile)
+    # batch mode draws many charts in one process
+    plt.close(fig)
+
+
+def batch_outfile(opts, name: str) -> str:
+    return str(Path(opts.batch) / (re.sub(r"[^\w.-]+", "_", name) + ".png"))
+
+
+def run_batch(opts):
+    """
+    One chart per input file, with the file name as the default title, or
+    with --key one chart per key, from a single read of the input.
+    """
+    Path(opts.batch).mkdir(parents=True, exist_ok=True)
+    if opts.key:
+        df = top_keys(aggregate(get_data(opts), opts), opts)
+        for key, group in series(df):
+            chart = argparse.Namespace(**vars(opts))
+            chart.outfile = batch_outfile(opts, key)
+            chart.title = opts.title or key
+            plot(group.drop(columns="key"), chart)
+            logging.info("wrote %s", chart.outfile)
+        return
+
+    names = set()
+    for source in opts.input:
+        name = Path(source).stem
+        if name in names:
+            name = f"{name}-{len(names) + 1}"
+        names.add(name)
+
+        chart = argparse.Namespace(**vars(opts))
+        chart.outfile = batch_outfile(opts, name)
+        chart.title = opts.title or Path(source).name
+        df = aggregate(read_source(source, opts), opts)
+        plot(df.drop(columns="key", errors="ignore"), chart)
+        logging.info("wrote %s", chart.outfile)
 
 
 def run(opts):
     logging.debug("starting")
+    if opts.batch:
+        run_batch(opts)
+        return
+
     df = get_data(opts)
+    df = aggregate(df, opts)
+    df = top_keys(df, opts)
     plot(df, opts)
 
-    cmd = ["open", opts.outfile]
-    logging.info(cmd)
-    os.execvp(cmd[0], cmd)
+    if opts.no_open:
+        logging.info("wrote %s", opts.outfile)
+    else:
+        plotting.show(opts.outfile)
 
 
 if __name__ == "__main__":
@@ -8,10 +8,16 @@ DESCRIPTION:
 
     Every wanted to quickly visualize some log output from the command line?
     I often grab some data out of a logfile, and then want to visualize it, e.g.
-    What is the hourly rate of this error message.
-    Input is two columns. Unless --basic is specified, the first column is a
-    datetime, and the second column is a value. --basic turns on the basic 
-    x.y plot mode, where the first column is just x, and the second column is y.
+    How are the response times of this service spread out over the day.
+    Input is one number per line. Each value is plotted against its line
+    number, as a density plot: the points are counted into a fixed grid of
+    cells while the input is read, and the grid is drawn with a log color
+    scale. Memory use depends on the grid size, not the number of points, so
+    100M values plot as easily as 100.
+
+    The grid starts out covering the range of the first values. When a value
+    or line number falls outside it, the grid doubles along that axis and
+    pairs of cells are merged, so the cells stay evenly sized.
 
 AUTHOR:
 
@@ -19,100 +25,214 @@ AUTHOR:
 
 REQUIREMENTS:
 
-    The python pandas and matplot libraries are required.
+    The python numpy and matplot libraries are required.
 
 EXAMPLES:
 
     # common usage:
 
+    # response times from an access log
+    awk '{print $NF}' access.log | dotplot.py
 
+    # a finer grid, on a large chart
+    dotplot.py --grid 1000x400 --large values.txt
 
-from python:
+    # one chart per file, in one process, into /tmp/charts/<name>.png
+    dotplot.py --batch /tmp/charts latency/*.txt
 
-    import dateplot
-    opts = dateplot.parse_args(['/tmp/mydata'])
+from python:
 
-    # dateplot.run(opts)
-    df = dateplot.get_data(opts)
-    dateplot.plot(df, opts)
+    import dotplot
+    opts = dotplot.parse_args(['/tmp/mydata'])
 
-There are a lot of options so that it can be quickly used for a variety of stuff.
+    # dotplot.run(opts)
+    grid = dotplot.get_data(opts)
+    dotplot.plot(grid, opts)
 
 """
 
-from __future__ import print_function
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING
 
 import argparse
 import fileinput
 import logging
-import os
+import re
 import sys
 
-from pandas import Series, DataFrame
-import pandas
-import matplotlib.pyplot
+import plotting
+from plotting import read_values
 
-pd = pandas
-plt = matplotlib.pyplot
+if TYPE_CHECKING:
+    import numpy as np
 
 cf0 = '{:,.0f}'.format
 cf2 = '{:,.2f}'.format
 
-
 TIMESTAMP_FORMAT='%(asctime)s %(levelname)s - %(message)s'
 
+
+def grid_size(value):
+    m = re.match(r'^(\d+)x(\d+)$', value)
+    if not m or not all(int(n) > 1 for n in m.groups()):
+        raise argparse.ArgumentTypeError(f'{value} is not WIDTHxHEIGHT, e.g. 400x200')
+    return int(m.group(1)), int(m.group(2))
+
+
 def parse_args(args=None):
-    desc=""
+    desc="density plot of one number per line, against the line number"
     p = argparse.ArgumentParser(description=desc)
-    p.add_argument('--outfile', '-o', 
+    p.add_argument('--outfile', '-o',
         help='output file. default=%(default)s',
-        default='/tmp/dateplot.png')
-    p.add_argument('--symbol', '-s', 
-            help='alternate symbol, e.g. "*" for chart')
-    p.add_argument('--title', '-T', 
+        default='/tmp/dotplot.png')
+    p.add_argument('--no-open', '-n', action='store_true',
+            help="don't open the chart in a viewer")
+    p.add_argument('--batch', metavar='FOLDER',
+            help='write one chart per input file to FOLDER/<name>.png, in one process')
+    p.add_argument('--title', '-T',
             help="title for the chart")
 
     p.add_argument('-x', type=float, help='chart width (inches)')
     p.add_argument('-y', type=float, help='chart height (inches)')
     p.add_argument('--large', '-L', action='store_true',
-            help='large output dimensions, 10x12',)
+            help='large output dimensions, 20x10',)
 
-    p.add_argument('--points', '-p', 
-        help='matplotlib point format string., e.g. "." or "xb-" default=%s(default)',
-        default='o')
+    p.add_argument('--grid', '-g', type=grid_size, default='400x200',
+        help='cells across and up the density grid. default=%(default)s')
+    p.add_argument('--cmap', default='viridis',
+        help='matplotlib colormap. default=%(default)s')
 
     p.add_argument('input', nargs='*',
         help='zero or more input files. Otherwise read from STDIN',)
-  
+
     # accept arguments as a param, so we
     # can import and run this module with a commandline-like
     # syntax.
-    if args is None: 
+    if args is None:
         args = sys.argv[1:]
-    return p.parse_args(args)
-
-def get_data(opts):
-    args = {
-    'names':['val'],
-    }
-    if opts.tsv:
-         args['sep'] = '\t'
-        
-    elif opts.csv:
-         args['sep'] = ','
-    else:
-        args['sep'] = r"\s+"
-    
-    indata = pd.compat.StringIO("".join([s for s in fileinput.input(opts.input)]))
-    df = pd.read_table(indata, **args)
-
-    logging.debug(df.head())
-    logging.debug("dtype: %s", df.dtypes)
-
-    #df = df.sort_values('datetime', ascending=True)
-    return df
-
-def plot(df, opts):
+    opts = p.parse_args(args)
+    if opts.batch and not opts.input:
+        p.error('--batch needs input files')
+    return opts
+
+
+class DensityGrid:
+    """
+    Point counts in a width x height grid of cells. Column c holds the points
+    with index in [c * span, (c + 1) * span), and the rows split [lo, hi)
+    evenly. The grid grows by doubling span or the value range.
+    """
+
+    def __init__(self, width: int, height: int):
+        import numpy as np
+
+        self.width = width
+        self.height = height
+        self.counts = np.zeros((height, width), dtype=np.int64)
+        self.span = 1
+        self.lo = self.hi = None
+        self.n = 0
+
+    @staticmethod
+    def _pair_sums(counts: np.ndarray, axis: int, from_end=False) -> np.ndarray:
+        """
+        Sums of neighbouring cells along axis. With an odd number of cells,
+        the last one, or the first from_end, is paired with an empty cell.
+        """
+        import numpy as np
+
+        n = counts.shape[axis]
+        if n % 2:
+            pad = [(0, 0)] * counts.ndim
+            pad[axis] = (1, 0) if from_end else (0, 1)
+            counts = np.pad(counts, pad)
+            n += 1
+        return counts.take(np.arange(0, n, 2), axis) + counts.take(np.arange(1, n, 2), axis)
+
+    def _merge_columns(self):
+        counts = self.counts
+        merged = self._pair_sums(counts, 1)
+        counts[:] = 0
+        counts[:, : merged.shape[1]] = merged
+        self.span *= 2
+
+    def _merge_rows(self, up: bool):
+        # the rows stay lined up with lo going up, and with hi going down
+        counts = self.counts
+        merged = self._pair_sums(counts, 0, from_end=not up)
+        counts[:] = 0
+        if up:
+            counts[: len(merged)] = merged
+            self.hi = self.lo + 2 * (self.hi - self.lo)
+        else:
+            counts[self.height - len(merged) :] = merged
+            self.lo = self.hi - 2 * (self.hi - self.lo)
+
+    def add(self, values: np.ndarray) -> None:
+        import numpy as np
+
+        # nan and inf parse as floats, but have no place on the grid
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        low, high = values.min(), values.max()
+        if self.lo is None:
+            self.lo = float(low)
+            # past 2**53 adding 1 is lost to rounding, so widen by magnitude
+            step = max(1.0, abs(self.lo) * 2**-40)
+            self.hi = float(high) if high > low else self.lo + step
+            # leave room so the largest value lands inside the last row
+            self.hi += (self.hi - self.lo) / self.height
+            assert self.hi > self.lo
+        while high >= self.hi:
+            self._merge_rows(up=True)
+        while low < self.lo:
+            self._merge_rows(up=False)
+        end = self.n + len(values)
+        while end > self.width * self.span:
+            self._merge_columns()
+
+        columns = np.arange(self.n, end) // self.span
+        scale = self.height / (self.hi - self.lo)
+        rows = ((values - self.lo) * scale).astype(np.int64)
+        np.clip(rows, 0, self.height - 1, out=rows)
+        cells = np.bincount(rows * self.width + columns, minlength=self.counts.size)
+        self.counts += cells.reshape(self.counts.shape)
+        self.n = end
+
+    def _bounds(self) -> tuple[int, int, int]:
+        """the columns holding points, and the rows from the lowest to highest"""
+        filled = self.counts.any(axis=1).nonzero()[0]
+        return -(-self.n // self.span), filled[0], filled[-1] + 1
+
+    def used(self) -> np.ndarray:
+        """the part of the grid holding points"""
+        columns, bottom, top = self._bounds()
+        return self.counts[bottom:top, :columns]
+
+    def extent(self) -> list[float]:
+        columns, bottom, top = self._bounds()
+        row = (self.hi - self.lo) / self.height
+        return [0, columns * self.span, self.lo + bottom * row, self.lo + top * row]
+
+
+def read_grid(lines, opts) -> DensityGrid:
+    grid = DensityGrid(*opts.grid)
+    for values in read_values(lines):
+        grid.add(values)
+    logging.debug("%s points, %s per column", cf0(grid.n), cf0(grid.span))
+    return grid
+
+
+def get_data(opts) -> DensityGrid:
+    return read_grid(fileinput.input(opts.input), opts)
+
+
+def plot(grid: DensityGrid, opts):
+    import numpy as np
+    from matplotlib.colors import LogNorm
 
     dims = [6,4]
     if opts.large:
@@ -122,25 +242,61 @@ def plot(df, opts):
     if opts.y:
         dims[1] = opts.y
 
+    plt = plotting.pyplot()
     fig = plt.figure()
     ax = fig.add_subplot(111)
-    ax.plot(opts.points,y=df['val'])
-    date_format = get_date_output(opts)
+    if grid.n:
+        counts = np.ma.masked_equal(grid.used(), 0)
+        image = ax.imshow(counts, origin='lower', aspect='auto', interpolation='nearest',
+            extent=grid.extent(), cmap=opts.cmap, norm=LogNorm())
+        fig.colorbar(image, ax=ax, label='points')
+    else:
+        logging.warning("no values to plot")
+    ax.set_xlabel('line')
+    ax.set_ylabel('value')
 
     if opts.title:
         plt.title(opts.title)
 
     fig.set_size_inches(*dims)
-    plt.savefig(opts.outfile)
+    fig.savefig(opts.outfile)
+    plt.close(fig)
+
+def batch_outfile(opts, name: str) -> str:
+    return str(Path(opts.batch) / (re.sub(r'[^\w.-]+', '_', name) + '.png'))
+
+
+def run_batch(opts):
+    """One chart per input file, with the file name as the default title"""
+    Path(opts.batch).mkdir(parents=True, exist_ok=True)
+    names = set()
+    for source in opts.input:
+        name = Path(source).stem
+        if name in names:
+            name = f"{name}-{len(names) + 1}"
+        names.add(name)
+
+        chart = argparse.Namespace(**vars(opts))
+        chart.outfile = batch_outfile(opts, name)
+        chart.title = opts.title or Path(source).name
+        with open(source) as lines:
+            plot(read_grid(lines, opts), chart)
+        logging.info("wrote %s", chart.outfile)
+
 
 def run(opts):
     logging.debug("starting")
-    df = get_data(opts)
-    plot(df, opts)
+    if opts.batch:
+        run_batch(opts)
+        return
 
-    cmd = ['open', opts.outfile]
-    logging.info(cmd)
-    os.execvp(cmd[0], cmd)
+    grid = get_data(opts)
+    plot(grid, opts)
+
+    if opts.no_open:
+        logging.info("wrote %s", opts.outfile)
+    else:
+        plotting.show(opts.outfile)
 
 if __name__ == '__main__':
     opts = parse_args(sys.argv[1:])
@@ -1,52 +1,493 @@
 #!/usr/bin/env python3
 """
 find gaps in logfiles
+
+Each timestamped line is compared with the previous timestamped line, and
+when they are more than --gap_threshold seconds apart, both are printed with
+--context lines around them. Lines without a timestamp are only context.
+
+The log is streamed: only the last --context lines are kept, so memory use
+doesn't grow with the size of the log.
+
+    gapfinder.py -g 30 -c 3 -l app.log
+
+Timestamps are found at the start of the line, in one of these formats,
+picked by --timestamp or sniffed from the first lines:
+
+    slash    24/08/01 07:08:30
+    iso      2024-08-01T07:08:30.123+02:00, or with a space, or in [brackets]
+    epoch    1722496110 or 1722496110123 (milliseconds), or 1722496110.123
+    syslog   Aug  1 07:08:30, in the current year
+
+Anything else can be matched with --pattern and --format, a regex whose first
+group (or whole match) is parsed with strptime:
+
+    gapfinder.py --pattern 'time=(\\S+)' --format '%Y%m%d.%H%M%S' -l app.log
+
+With --summary, the gaps between all timestamped lines are summarized
+instead: their p50, p99 and max, the number over --gap_threshold, and the
+--top largest gaps. The percentiles come from a log-bucketed histogram
+accurate to about 1%, so memory use is still fixed.
+
+    gapfinder.py --summary --top 5 -l app.log
+
+Many logfiles can be given, e.g. a day's rotated logs from each host. Each
+is scanned in a worker process (--jobs), with its own timestamp format, and
+its gaps are written after a "==> file <==" header. With --merged, the files'
+lines are merged by time with a heap into one timeline, labeled file:line:,
+and the gaps are those when none of the files has a line: when every host
+went quiet at once.
+
+    gapfinder.py -g 60 --merged host*/app.log.gz
 """
 
+from collections import deque
+from datetime import datetime, timezone
+
 import argparse
-import datetime
+import functools
+import gzip
+import heapq
+import io
+import itertools
+import logging
+import math
+import multiprocessing
+import operator
+import os
 import re
 import sys
+import time
 
-def identify_gaps(logfile, output_file, gap_threshold, context):
-    pattern = re.compile(r'^\d{2}/\d{2}/\d{2} \d{2}:\d{2}:\d{2}\s+')
+# "yy/mm/dd HH:MM:SS", then whitespace
+TIMESTAMP_LENGTH = 17
+SEPARATORS = ((2, '/'), (5, '/'), (8, ' '), (11, ':'), (14, ':'))
 
-    lines = [line.rstrip('\n') for line in logfile]
-    num_lines = len(lines)
+ISO_PATTERN = re.compile(
+    r'\[?(\d{4})-(\d\d)-(\d\d)[T ](\d\d):(\d\d):(\d\d)([.,]\d+)?(Z|[+-]\d\d:?\d\d)?(?![\d.])')
+EPOCH_PATTERN = re.compile(r'\[?(\d{10}(?:\.\d+)?|\d{13})(?![\d.])')
+SYSLOG_PATTERN = re.compile(r'([A-Z][a-z]{2}) ([ \d]\d) (\d\d):(\d\d):(\d\d)(?!\d)')
+MONTHS = {name: n for n, name in enumerate(
+    'Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec'.split(), 1)}
 
-    # Keep track of the last matching line index
-    last_match_index = -1
+EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+
+# lines looked at to pick a timestamp format
+SNIFF_LINES = 100
+
+# relative accuracy of the --summary percentiles
+SKETCH_ACCURACY = 0.01
+
+
+@functools.lru_cache(maxsize=1024)
+def day_seconds(year: int, month: int, day: int) -> int:
+    """epoch seconds at the start of the day"""
+    return (datetime(year, month, day).toordinal() - EPOCH_ORDINAL) * 86400
+
+
+def line_seconds(line: str) -> int | None:
+    """
+    Seconds of the "yy/mm/dd HH:MM:SS" timestamp at the start of line, or None
+    if it has none. The fields are at fixed positions, so they are sliced out
+    rather than parsed with strptime.
+    """
+    if len(line) <= TIMESTAMP_LENGTH or not line[TIMESTAMP_LENGTH].isspace():
+        return None
+    for position, separator in SEPARATORS:
+        if line[position] != separator:
+            return None
+    digits = line[0:2] + line[3:5] + line[6:8] + line[9:11] + line[12:14] + line[15:17]
+    if not (digits.isdigit() and digits.isascii()):
+        return None
+    # %y's century: 69-99 are 19xx
+    yy = int(digits[0:2])
+    return (
+        day_seconds(yy + (1900 if yy >= 69 else 2000), int(digits[2:4]), int(digits[4:6]))
+        + int(digits[6:8]) * 3600
+        + int(digits[8:10]) * 60
+        + int(digits[10:12])
+    )
+
+
+# The timestamp extractors' seconds() returns the epoch seconds of a line's
+# timestamp, or None for a line without one. Times without a UTC offset are
+# taken as UTC.
+
+
+class SlashTimestamps:
+    """24/08/01 07:08:30, the original format"""
+
+    name = 'slash'
+    seconds = staticmethod(line_seconds)
+
+
+class IsoTimestamps:
+    name = 'iso'
+
+    def seconds(self, line):
+        m = ISO_PATTERN.match(line)
+        if not m:
+            return None
+        year, month, day, hours, minutes, secs, fraction, zone = m.groups()
+        seconds = (day_seconds(int(year), int(month), int(day))
+                   + int(hours) * 3600 + int(minutes) * 60 + int(secs))
+        if fraction:
+            seconds += float('.' + fraction[1:])
+        if zone and zone != 'Z':
+            offset = int(zone[1:3]) * 3600 + int(zone[-2:]) * 60
+            seconds += -offset if zone[0] == '+' else offset
+        return seconds
+
+
+class EpochTimestamps:
+    name = 'epoch'
+
+    def seconds(self, line):
+        m = EPOCH_PATTERN.match(line)
+        if not m:
+            return None
+        digits = m.group(1)
+        if len(digits) == 13:
+            return int(digits) / 1000
+        return float(digits) if '.' in digits else int(digits)
+
+
+class SyslogTimestamps:
+    """
+    Aug  1 07:08:30. There is no year, so it starts at the current one, and
+    goes up by one when the month goes back, from Dec to Jan.
+    """
+
+    name = 'syslog'
+
+    def __init__(self):
+        self.year = time.localtime().tm_year
+        self.month = None
+
+    def seconds(self, line):
+        m = SYSLOG_PATTERN.match(line)
+        if not m or m.group(1) not in MONTHS:
+            return None
+        month = MONTHS[m.group(1)]
+        if self.month is not None and month < self.month:
+            self.year += 1
+        self.month = month
+        try:
+            day = day_seconds(self.year, month, int(m.group(2)))
+        except ValueError:
+            # Feb 29 of another year
+            return None
+        return day + int(m.group(3)) * 3600 + int(m.group(4)) * 60 + int(m.group(5))
+
+
+class PatternTimestamps:
+    """the first group of pattern, or all of it, parsed with date_format"""
+
+    name = 'pattern'
+
+    def __init__(self, pattern, date_format):
+        self.pattern = re.compile(pattern)
+        self.date_format = date_format
+
+    def seconds(self, line):
+        m = self.pattern.search(line)
+        if not m:
+            return None
+        text = m.group(1) if self.pattern.groups else m.group()
+        try:
+            date = datetime.strptime(text, self.date_format)
+        except ValueError:
+            return None
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        return date.timestamp()
+
+
+EXTRACTORS = {e.name: e for e in (SlashTimestamps, IsoTimestamps, EpochTimestamps, SyslogTimestamps)}
+
+
+def sniff_extractor(lines):
+    """the extractor that finds the most timestamps in lines, slash if none do"""
+    counts = []
+    for extractor in EXTRACTORS.values():
+        seconds = extractor().seconds
+        counts.append((sum(seconds(line) is not None for line in lines), extractor.name))
+    # max() keeps the first of a tie, in EXTRACTORS order
+    found, name = max(counts, key=lambda count: count[0])
+    if not found:
+        logging.warning('no timestamps in the first %d lines, trying slash', len(lines))
+        name = 'slash'
+    logging.debug('timestamps: %s', name)
+    return EXTRACTORS[name]()
+
+
+def open_log(logfile, opts):
+    """the lines of logfile, and the extractor for their timestamps"""
+    if opts.pattern:
+        return logfile, PatternTimestamps(opts.pattern, opts.format)
+    if opts.timestamp != 'auto':
+        return logfile, EXTRACTORS[opts.timestamp]()
+    head = list(itertools.islice(logfile, SNIFF_LINES))
+    return itertools.chain(head, logfile), sniff_extractor(head)
 
-    for i in range(num_lines):
-        if not pattern.match(lines[i]):
-            continue
 
-        curr_time = datetime.datetime.strptime(pattern.match(lines[i]).group(), '%y/%m/%d %H:%M:%S ')
+def gap_seconds(curr_time, prev_time) -> float:
+    # rounded to microseconds, so 0.3 - 0.2 is 0.1
+    return round(float(curr_time - prev_time), 6)
 
-        if last_match_index >= 0:
-            time_diff = (curr_time - prev_time).total_seconds()
+
+def timed_lines(lines, extractor):
+    """(seconds, line) of each line, with None for the seconds of a line without a timestamp"""
+    seconds = extractor.seconds
+    for line in lines:
+        line = line.rstrip('\n')
+        yield seconds(line), line
+
+
+def identify_gaps(logfile, output_file, gap_threshold, context, extractor=None):
+    report_gaps(timed_lines(logfile, extractor or SlashTimestamps()),
+                output_file, gap_threshold, context)
+
+
+def report_gaps(timeline, output_file, gap_threshold, context):
+    """print the gaps in timeline, (seconds, line) pairs, with context lines"""
+    # the context lines before the last timestamped line, that line, and the
+    # lines since it, at most context of them
+    before = deque(maxlen=context)
+    prev_line = None
+    since = deque(maxlen=context)
+    prev_time = None
+
+    # gap reports waiting for their trailing context lines, in order: the
+    # number of lines still wanted, and the lines not yet written
+    reports = deque()
+
+    for curr_time, line in timeline:
+        for report in reports:
+            if report[0]:
+                report[0] -= 1
+                report[1].append(line)
+        write_reports(reports, output_file)
+
+        if curr_time is None:
+            since.append(line)
+            continue
+
+        if prev_time is not None:
+            time_diff = gap_seconds(curr_time, prev_time)
 
             if time_diff > gap_threshold:
-                output_file.write(f"\nGap detected: {time_diff} seconds between the following lines:\n")
+                report = [f"\nGap detected: {time_diff} seconds between the following lines:"]
+                report.extend(before)
+                report += [prev_line, "===== GAP =====", line]
+                reports.append([context, report])
+                write_reports(reports, output_file)
+
+        if prev_line is not None:
+            before.append(prev_line)
+        before.extend(since)
+        since.clear()
+        prev_time = curr_time
+        prev_line = line
 
-                # Print context lines before the gap
-                start_index = max(0, last_match_index - context)
-                for j in range(start_index, last_match_index):
-                    output_file.write(lines[j] + '\n')
+    write_reports(reports, output_file, done=True)
 
-                output_file.write(lines[last_match_index] + '\n')
-                output_file.write(f"===== GAP =====\n")
-                output_file.write(lines[i] + '\n')
 
-                # Print context lines after the gap
-                end_index = min(num_lines, i + context + 1)
-                for j in range(i+1, end_index):
-                    output_file.write(lines[j] + '\n')
+def write_reports(reports, output_file, done=False):
+    """
+    Write what is known of the first report, and the ones after it that are
+    complete. A later gap can start in the trailing context of an earlier
+    one, and its lines wait until that one is finished.
+    """
+    while reports:
+        wanted, lines = reports[0]
+        if lines:
+            output_file.write('\n'.join(lines) + '\n')
+            lines.clear()
+        if wanted and not done:
+            return
+        reports.popleft()
 
+
+class GapSketch:
+    """
+    Counts of gaps in buckets growing by a factor of gamma, so any quantile
+    is within accuracy of the true one, relatively, and the number of buckets
+    only grows with the log of the largest gap. Each bucket also keeps its
+    smallest and largest gap. Gaps of zero, or less when lines are out of
+    order, are counted separately.
+    """
+
+    def __init__(self, accuracy=SKETCH_ACCURACY):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0
+        self.negative = 0
+        self.n = 0
+        self.max = None
+
+    def add(self, gap: float) -> None:
+        self.n += 1
+        if self.max is None or gap > self.max:
+            self.max = gap
+        if gap <= 0:
+            self.zeros += 1
+            self.negative += gap < 0
+            return
+        bucket = math.ceil(math.log(gap) / self.log_gamma)
+        counts = self.buckets.get(bucket)
+        if counts is None:
+            self.buckets[bucket] = [1, gap, gap]
+            return
+        counts[0] += 1
+        if gap < counts[1]:
+            counts[1] = gap
+        elif gap > counts[2]:
+            counts[2] = gap
+
+    def quantile(self, q: float) -> float | None:
+        if not self.n:
+            return None
+        rank = q * (self.n - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for bucket in sorted(self.buckets):
+            count, low, high = self.buckets[bucket]
+            seen += count
+            if rank < seen:
+                # the middle of (gamma^(bucket-1), gamma^bucket] by relative
+                # error, within the gaps seen, which are often all the same
+                middle = 2 * self.gamma ** bucket / (self.gamma + 1)
+                return min(max(middle, low), high)
+        return self.max
+
+
+def summarize_gaps(logfile, output_file, gap_threshold, top, extractor=None):
+    summarize_timeline(timed_lines(logfile, extractor or SlashTimestamps()),
+                       output_file, gap_threshold, top)
+
+
+def summarize_timeline(timeline, output_file, gap_threshold, top, numbered=True):
+    """
+    the distribution of the gaps in timeline, (seconds, line) pairs, and the
+    top largest, by line number if numbered
+    """
+    sketch = GapSketch()
+    over = 0
+    # the top largest gaps, smallest first: gap, line number, lines
+    largest = []
+    prev_time = prev_line = None
+
+    for n, (curr_time, line) in enumerate(timeline, 1):
+        if curr_time is None:
+            continue
+        if prev_time is not None:
+            gap = gap_seconds(curr_time, prev_time)
+            sketch.add(gap)
+            over += gap > gap_threshold
+            if len(largest) < top:
+                heapq.heappush(largest, (gap, n, prev_line, line))
+            elif top and gap > largest[0][0]:
+                heapq.heapreplace(largest, (gap, n, prev_line, line))
         prev_time = curr_time
-        last_match_index = i
+        prev_line = line
 
-if __name__ == '__main__':
+    output_file.write(f"{sketch.n:,} gaps between timestamped lines\n")
+    if not sketch.n:
+        return
+    for label, q in (('p50', 0.5), ('p99', 0.99)):
+        output_file.write(f"  {label}: {sketch.quantile(q):.6g} seconds\n")
+    output_file.write(f"  max: {sketch.max} seconds\n")
+    output_file.write(f"  over {gap_threshold} seconds: {over:,}\n")
+    if sketch.negative:
+        output_file.write(f"  out of order: {sketch.negative:,}\n")
+
+    if largest:
+        output_file.write(f"\nLargest {len(largest)} gaps:\n")
+    for gap, n, prev_line, line in sorted(largest, key=lambda g: (-g[0], g[1])):
+        where = f" before line {n}" if numbered else ""
+        output_file.write(f"\n{gap} seconds{where}:\n{prev_line}\n===== GAP =====\n{line}\n")
+
+
+def open_path(path):
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt')
+    return open(path)
+
+
+def scan(timeline, output_file, opts, numbered=True):
+    """the gaps, or the --summary, of a (seconds, line) timeline"""
+    if opts.summary:
+        summarize_timeline(timeline, output_file, opts.gap_threshold, opts.top, numbered)
+    else:
+        report_gaps(timeline, output_file, opts.gap_threshold, opts.context)
+
+
+def scan_log(logfile, output_file, opts):
+    lines, extractor = open_log(logfile, opts)
+    scan(timed_lines(lines, extractor), output_file, opts)
+
+
+def scan_file(path, opts):
+    """scan() of one file in a worker process, returning the output"""
+    output = io.StringIO()
+    with open_path(path) as logfile:
+        scan_log(logfile, output, opts)
+    return output.getvalue()
+
+
+def scan_files(paths, output_file, opts):
+    """
+    Scan each file in its own worker process, and write their results in
+    order, each after a tail-like "==> path <==" header.
+    """
+    # the open --logfile and --output_file can't be sent to the workers
+    settings = argparse.Namespace(**{k: v for k, v in vars(opts).items()
+                                     if k not in ('logfile', 'output_file')})
+    jobs = min(opts.jobs or os.cpu_count() or 1, len(paths))
+    with multiprocessing.Pool(jobs) as pool:
+        results = pool.imap(functools.partial(scan_file, opts=settings), paths)
+        for n, (path, result) in enumerate(zip(paths, results)):
+            if n:
+                output_file.write('\n')
+            output_file.write(f"==> {path} <==\n{result}")
+
+
+def file_timeline(path, opts):
+    """
+    (last seconds, seconds, line) of each line of path, labeled "path:n: ".
+    Lines without a timestamp keep the last timestamp, so they stay after
+    their line in a merge. The timestamp format is sniffed for each file.
+    """
+    with open_path(path) as logfile:
+        lines, extractor = open_log(logfile, opts)
+        last = -math.inf
+        for n, (seconds, line) in enumerate(timed_lines(lines, extractor), 1):
+            if seconds is not None:
+                last = seconds
+            yield last, seconds, f"{path}:{n}: {line}"
+
+
+def merged_timeline(paths, opts):
+    """the lines of all the files as one (seconds, line) timeline, in time order"""
+    timelines = [file_timeline(path, opts) for path in paths]
+    for _, seconds, line in heapq.merge(*timelines, key=operator.itemgetter(0)):
+        yield seconds, line
+
+
+def scan_merged(paths, output_file, opts):
+    """
+    The gaps when none of the files has a line, e.g. when all the hosts went
+    quiet at once. Each file must be in time order, as logs are.
+    """
+    scan(merged_timeline(paths, opts), output_file, opts, numbered=False)
+
+
+def parse_args(args=None):
     default_logfile = 'stdin'
     default_output_file = 'stdout'
     default_gap_threshold = 5
@@ -61,6 +502,41 @@ if __name__ == '__main__':
                         help=f'gap threshold in seconds (default: {default_gap_threshold})')
     parser.add_argument('--context', '-c', type=int, default=default_context,
                         help=f'number of context lines to print (default: {default_context})')
-    args = parser.parse_args()
+    parser.add_argument('--timestamp', '-t', choices=['auto', *EXTRACTORS], default='auto',
+                        help='timestamp format at the start of the lines. auto: sniffed '
+                        'from the first lines (default: %(default)s)')
+    parser.add_argument('--pattern', '-p',
+                        help='regex finding the timestamp, parsed with --format')
+    parser.add_argument('--format', '-f',
+                        help='strptime format of the --pattern timestamps')
+    parser.add_argument('--summary', '-s', action='store_true',
+                        help='summarize the gaps instead of printing each one')
+    parser.add_argument('--top', '-k', type=int, default=10,
+                        help='largest gaps shown by --summary (default: %(default)s)')
+    parser.add_argument('--merged', '-m', action='store_true',
+                        help='find the gaps in the lines of all the logfiles together')
+    parser.add_argument('--jobs', '-j', type=int,
+                        help='worker processes scanning the logfiles (default: one per cpu)')
+    parser.add_argument('--debug', '-d', action='store_true', help='turn on debugging')
+    parser.add_argument('logfiles', nargs='*',
+                        help='logfiles to scan, each on its own, or --merged. .gz files are '
+                        'decompressed')
+    opts = parser.parse_args(args)
+    if bool(opts.pattern) != bool(opts.format):
+        parser.error('--pattern and --format go together')
+    return opts
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
 
-    identify_gaps(args.logfile, args.output_file, args.gap_threshold, args.context)
+    if args.merged and args.logfiles:
+        scan_merged(args.logfiles, args.output_file, args)
+    elif len(args.logfiles) > 1:
+        scan_files(args.logfiles, args.output_file, args)
+    elif args.logfiles:
+        with open_path(args.logfiles[0]) as logfile:
+            scan_log(logfile, args.output_file, args)
+    else:
+        scan_log(args.logfile, args.output_file, args)
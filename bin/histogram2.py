@@ -1,31 +1,117 @@
 #!/usr/bin/env python
+"""
+Plot a histogram of one number per line.
+
+The input is read in chunks into numpy arrays, and only the bin counts are
+kept, so there is no limit on the number of values. With --range the bin
+edges are fixed and the input is read once. Otherwise a first pass finds the
+smallest and largest values; STDIN is copied to a temporary file for it.
+
+    $ histogram2.py --bins 50 --outfile /tmp/latency.png latency.txt
+"""
 
-import matplotlib.pyplot as plt
 import argparse
+import logging
+import shutil
 import sys
-import fileinput
+import tempfile
+
+import numpy as np
+
+import plotting
+from plotting import read_values
+
+
+def value_range(handle):
+    """the smallest and largest finite values, in one pass"""
+    lo, hi = np.inf, -np.inf
+    for values in read_values(handle):
+        values = values[np.isfinite(values)]
+        if len(values):
+            lo = min(lo, values.min())
+            hi = max(hi, values.max())
+    if lo > hi:
+        return 0.0, 1.0
+    if lo == hi:
+        return lo - 0.5, hi + 0.5
+    return float(lo), float(hi)
+
+
+def count_bins(handle, edges):
+    counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    outside = 0
+    for values in read_values(handle):
+        values = values[np.isfinite(values)]
+        binned, _ = np.histogram(values, edges)
+        counts += binned
+        outside += len(values) - binned.sum()
+    if outside:
+        logging.warning('%d values outside the range %s to %s', outside, edges[0], edges[-1])
+    return counts
+
 
-def plot_histogram(data, bins, size):
+def histogram(handle, bins, limits=None):
+    """bin edges and counts, reading handle once with a range, or twice"""
+    if limits is None:
+        if not handle.seekable():
+            spool = tempfile.TemporaryFile('w+')
+            shutil.copyfileobj(handle, spool)
+            handle = spool
+        handle.seek(0)
+        limits = value_range(handle)
+        handle.seek(0)
+    edges = np.linspace(*limits, bins + 1)
+    return edges, count_bins(handle, edges)
+
+
+def plot_histogram(edges, counts, size, outfile=None):
+    plt = plotting.pyplot()
     plt.figure(figsize=size)
-    plt.hist(data, bins=bins, orientation='vertical')
-    plt.xlabel('Frequency')
-    plt.ylabel('Value')
-    plt.title('Horizontal Histogram')
+    plt.bar(edges[:-1], counts, width=np.diff(edges), align='edge')
+    plt.xlabel('Value')
+    plt.ylabel('Frequency')
+    plt.title('Histogram')
     plt.grid(True)
-    plt.show()
+    if outfile is None and not plotting.has_display():
+        outfile = '/tmp/histogram2.png'
+    if outfile:
+        plt.savefig(outfile)
+        logging.info('wrote %s', outfile)
+    else:
+        plt.show()
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='Plot a horizontal histogram.')
-    parser.add_argument('input', type=argparse.FileType('r'), 
-                        help='Input file containing a series of integers, ' +
+
+def bin_count(value):
+    if not value.isdigit() or int(value) < 1:
+        raise argparse.ArgumentTypeError(f'{value} is not a number of bins, 1 or more')
+    return int(value)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description='Plot a histogram.')
+    parser.add_argument('input', nargs='?', type=argparse.FileType('r'),
+                        help='Input file containing a series of numbers, ' +
                         'one per line. "-" for STDIN', default=sys.stdin)
     parser.add_argument('-x', default=10, type=int,
         help="x size. default=%(default)s")
     parser.add_argument('-y', default=6, type=int,
         help="y size. default=%(default)s")
-    parser.add_argument('--bins', type=int, default=10, help='Number of bins for the histogram.')
+    parser.add_argument('--bins', type=bin_count, default=10, help='Number of bins for the histogram.')
+    parser.add_argument('--range', nargs=2, type=float, metavar=('LOW', 'HIGH'),
+        help='fixed range of the bins, read the input in a single pass. ' +
+        'Values outside it are not counted')
+    parser.add_argument('-o', '--outfile',
+        help='write the chart to OUTFILE instead of showing it. ' +
+        'Without a display, it goes to /tmp/histogram2.png')
+    opts = parser.parse_args(args)
+    if opts.range and opts.range[0] >= opts.range[1]:
+        parser.error('--range LOW must be below HIGH')
+    return opts
 
-    args = parser.parse_args()
 
-    data = [int(line.strip()) for line in args.input]
-    plot_histogram(data, args.bins, (args.x, args.y))
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    edges, counts = histogram(args.input, args.bins, args.range)
+    plot_histogram(edges, counts, (args.x, args.y), args.outfile)
@@ -16,6 +16,10 @@ DESCRIPTION:
 
         * unique
 
+    With more than two inputs (or any of --exactly, --at-least, --counts), jset
+    reads every file once and records, for each distinct line, a bitmask of
+    the inputs that contain it. Inputs are numbered from 1 on the command line.
+
     There are other similar tools (like comm and zet), but jset provides
     shortcuts for visualizing and the data in tabular format, list format, json
     format and also provides some easy aliases to aid in understanding.
@@ -80,17 +84,61 @@ EXAMPLES:
       9
       99
 
+    # stream the intersection as soon as each line of b is read
+    $ jset.py --both --unsorted a b
+
+    # N-way: lines in exactly the 1st and 3rd inputs, in at least 4 of the 5
+    # inputs, and UpSet style counts for each combination of inputs
+    $ jset.py --exactly 1,3 mon tue wed thu fri
+    $ jset.py --at-least 4 mon tue wed thu fri
+    $ jset.py --counts mon tue wed
+      3	XXX	mon,tue,wed
+      2	X..	mon
+      1	.XX	tue,wed
+
+    # approximate overlap of huge inputs from HyperLogLog / MinHash sketches,
+    # saving the sketches for later comparisons without rereading the data
+    $ jset.py --estimate --save-sketches sketches/ mon.ids tue.ids
+      a	1000123	±8131
+      b	998765	±8120
+      union	1502334	±12213
+      both	495021	±10650
+      only_a	505102	±13505
+      only_b	503744	±13495
+      jaccard	0.3295	±0.0147
+
+    # merge saved sketches (or raw inputs), then compare them
+    $ jset.py --merge-sketches week.sketch sketches/mon.ids.sketch sketches/tue.ids.sketch
+    $ jset.py --estimate week.sketch wed.ids
+
+    # inputs larger than RAM: hash-partition both files into spill files on
+    # disk, compare one partition at a time, and merge the sorted results
+    $ jset.py --external --partitions 256 --tmpdir /scratch ids.a ids.b
+
 """
 
 from __future__ import print_function
 
 import argparse
+import base64
+import collections
+import hashlib
+import heapq
+import itertools
 import json
 import logging
+import math
+import os
 import sys
+import tempfile
 
 TIMESTAMP_FORMAT = "%(asctime)s %(levelname)s - %(message)s"
 
+SECTIONS = ["only_a", "only_b", "both"]
+
+# spill files must round-trip any line exactly, including stray \r
+SPILL_OPTS = dict(encoding="utf-8", errors="surrogateescape", newline="\n")
+
 
 def parse_args(args=None):
     desc = "set difference and intersection"
@@ -114,15 +162,123 @@ def parse_args(args=None):
     p.add_argument("-u", "--uniq", action="store_true")
     p.add_argument("-j", "--json", action="store_true")
     p.add_argument("-T", "--table", action="store_true", help="tabulate format")
+    p.add_argument(
+        "--unsorted",
+        action="store_true",
+        help="skip sorting. -2 and -3 stream results while the second file is read",
+    )
+    p.add_argument(
+        "-X",
+        "--external",
+        action="store_true",
+        help="disk-backed mode for inputs larger than memory",
+    )
+    p.add_argument(
+        "--partitions",
+        type=int,
+        default=64,
+        help="number of spill files per input in --external mode. "
+        "default: %(default)s",
+    )
+    p.add_argument(
+        "--tmpdir", help="directory for --external spill files. default: system tmp"
+    )
+    nway = p.add_mutually_exclusive_group()
+    nway.add_argument(
+        "--exactly",
+        metavar="N,N,...",
+        help="N-way: lines in exactly these inputs, e.g. 1,3",
+    )
+    nway.add_argument(
+        "--at-least",
+        type=int,
+        metavar="K",
+        help="N-way: lines in at least K inputs",
+    )
+    nway.add_argument(
+        "--counts",
+        action="store_true",
+        help="N-way: number of lines for each combination of inputs",
+    )
+    p.add_argument(
+        "-E",
+        "--estimate",
+        action="store_true",
+        help="approximate sizes and overlap of a and b from sketches. "
+        "inputs may be raw lines or saved sketches",
+    )
+    p.add_argument(
+        "--precision",
+        type=int,
+        default=14,
+        help="HyperLogLog precision, 2^P registers. default: %(default)s",
+    )
+    p.add_argument(
+        "--sketch-size",
+        type=int,
+        default=1024,
+        help="number of minimum hashes kept for the MinHash. default: %(default)s",
+    )
+    p.add_argument(
+        "--save-sketches",
+        metavar="DIR",
+        help="with --estimate, save a sketch of each input as DIR/<name>.sketch",
+    )
+    p.add_argument(
+        "--merge-sketches",
+        metavar="OUT",
+        help="merge the sketches of all inputs into OUT",
+    )
     p.add_argument("a", type=argparse.FileType("r"))
     p.add_argument("b", type=argparse.FileType("r"))
+    p.add_argument(
+        "more", nargs="*", type=argparse.FileType("r"), help="N-way: more inputs"
+    )
 
     # accept arguments as a param, so we
     # can import and run this module with a commandline-like
     # syntax.
     if args is None:
         args = sys.argv[1:]
-    return p.parse_args(args)
+    opts = p.parse_args(args)
+
+    opts.inputs = [opts.a, opts.b] + opts.more
+    opts.sketching = bool(opts.estimate or opts.merge_sketches)
+    if opts.estimate and opts.more:
+        p.error("--estimate compares exactly two inputs")
+    if opts.sketching and not 4 <= opts.precision <= 18:
+        p.error("--precision must be between 4 and 18")
+    opts.nway = not opts.sketching and bool(
+        opts.more or opts.exactly or opts.at_least or opts.counts
+    )
+    if opts.nway and opts.external:
+        p.error("--external only supports two inputs")
+    if opts.partitions < 1:
+        p.error("--partitions must be at least 1")
+    if opts.more and (opts.first or opts.second or opts.both or opts.uniq):
+        p.error("use --exactly or --at-least with more than two inputs")
+    if opts.exactly:
+        try:
+            opts.exactly = parse_input_spec(opts.exactly, len(opts.inputs))
+        except ValueError as e:
+            p.error(f"--exactly: {e}")
+    return opts
+
+
+def parse_input_spec(spec, n_inputs):
+    """turn a list of 1-based input numbers like '1,3' into a bitmask"""
+    mask = 0
+    for field in spec.split(","):
+        i = int(field)
+        if not 1 <= i <= n_inputs:
+            raise ValueError(f"input {i} is not between 1 and {n_inputs}")
+        mask |= 1 << (i - 1)
+    return mask
+
+
+def read_lines(fh):
+    for line in fh:
+        yield line.rstrip("\n")
 
 
 def print_join(data):
@@ -132,43 +288,435 @@ def print_join(data):
         print(item)
 
 
-def print_table(out):
+def print_json(out):
+    """stream the same layout as json.dumps(out, indent=2)"""
+    write = sys.stdout.write
+    write("{\n")
+    for n, section in enumerate(SECTIONS):
+        write(f"  {json.dumps(section)}: [")
+        empty = True
+        for item in out[section]:
+            write(("\n" if empty else ",\n") + "    " + json.dumps(item))
+            empty = False
+        write("]" if empty else "\n  ]")
+        write(",\n" if n < len(SECTIONS) - 1 else "\n")
+    write("}\n")
+
+
+def print_table(opts, out):
     from tabulate import tabulate
 
-    lines = make_matrix(out)
+    lines = make_matrix(out, unsorted=opts.unsorted)
 
     print(tabulate(lines, headers=["only_a", "only_b", "both"]))
 
 
-def make_matrix(out):
-    both = set(out["both"])
-    a = set(out["only_a"])
-    b = set(out["only_b"])
+def tag(items, col):
+    for item in items:
+        yield item, col
+
+
+def make_matrix(out, unsorted=False):
+    """one row per item, with the item placed in the column of its section.
+    The sections are disjoint and already sorted, so they are merged rather
+    than re-sorted."""
+    columns = [tag(out[section], col) for col, section in enumerate(SECTIONS)]
+    tagged = itertools.chain(*columns) if unsorted else heapq.merge(*columns)
 
     lines = []
-    for item in sorted(a.union(b).union(both)):
+    for item, col in tagged:
         row = [""] * 3
-        if item in both:
-            row[2] = item
-        elif item in a:
-            row[0] = item
-        else:
-            row[1] = item
+        row[col] = item
         lines.append(row)
     return lines
 
 
+def requested_sections(opts):
+    if opts.first:
+        return ["only_a"]
+    elif opts.second:
+        return ["only_b"]
+    elif opts.both:
+        return ["both"]
+    elif opts.uniq:
+        return ["only_a", "only_b"]
+    return SECTIONS
+
+
+def stream_only_a(opts):
+    # a dict keeps the unsorted output in the order of the first file
+    a = dict.fromkeys(read_lines(opts.a))
+    for line in read_lines(opts.b):
+        a.pop(line, None)
+    return iter(a)
+
+
+def stream_only_b(opts):
+    # items of b are added once emitted, so the one set also dedupes b
+    seen = set(read_lines(opts.a))
+    for line in read_lines(opts.b):
+        if line not in seen:
+            seen.add(line)
+            yield line
+
+
+def stream_both(opts):
+    a = set(read_lines(opts.a))
+    for line in read_lines(opts.b):
+        if line in a:
+            a.remove(line)
+            yield line
+
+
+def compute_section(opts, section):
+    """a single section, computed from one in-memory set while b streams"""
+    stream = {
+        "only_a": stream_only_a,
+        "only_b": stream_only_b,
+        "both": stream_both,
+    }[section]
+    items = stream(opts)
+    return {section: items if opts.unsorted else sorted(items)}
+
+
+def compute_sets(opts):
+    """all sections in one pass over b. Every distinct line is held once."""
+    only_a = dict.fromkeys(read_lines(opts.a))
+    only_b = {}
+    both = {}
+    for line in read_lines(opts.b):
+        if line in only_a:
+            del only_a[line]
+            both[line] = None
+        elif line not in both:
+            only_b[line] = None
+
+    out = {"only_a": only_a, "only_b": only_b, "both": both}
+    if opts.unsorted:
+        return {section: list(items) for section, items in out.items()}
+    return {section: sorted(items) for section, items in out.items()}
+
+
+def spill(fh, prefix, tmpdir, partitions):
+    """hash-partition the lines of fh into spill files. Equal lines always
+    land in the same partition number for both inputs."""
+    paths = [os.path.join(tmpdir, f"{prefix}.{i}") for i in range(partitions)]
+    files = [open(path, "w", **SPILL_OPTS) for path in paths]
+    try:
+        for line in read_lines(fh):
+            files[hash(line) % partitions].write(line + "\n")
+    finally:
+        for f in files:
+            f.close()
+    return paths
+
+
+def load_spill(path):
+    with open(path, **SPILL_OPTS) as f:
+        items = set(read_lines(f))
+    os.remove(path)
+    return items
+
+
+def merge_runs(paths):
+    """k-way merge of sorted run files"""
+    files = [open(path, **SPILL_OPTS) for path in paths]
+    try:
+        yield from heapq.merge(*[read_lines(f) for f in files])
+    finally:
+        for f in files:
+            f.close()
+
+
+def chain_runs(paths):
+    for path in paths:
+        with open(path, **SPILL_OPTS) as f:
+            yield from read_lines(f)
+
+
+def compute_external(opts, tmpdir):
+    """set operations with memory bounded by the largest partition.
+
+    Both inputs are hash-partitioned into spill files, each pair of partitions
+    is compared in memory and written out as sorted runs, and each section is
+    then produced lazily by merging its runs. Only the requested sections are
+    written, and --unsorted skips both the sorting and the merge."""
+    a_paths = spill(opts.a, "a", tmpdir, opts.partitions)
+    b_paths = spill(opts.b, "b", tmpdir, opts.partitions)
+    logging.debug("spilled %d partitions to %s", opts.partitions, tmpdir)
+
+    operations = {
+        "only_a": lambda a, b: a - b,
+        "only_b": lambda a, b: b - a,
+        "both": lambda a, b: a & b,
+    }
+    runs = {section: [] for section in requested_sections(opts)}
+    for i, (a_path, b_path) in enumerate(zip(a_paths, b_paths)):
+        a = load_spill(a_path)
+        b = load_spill(b_path)
+        for section in runs:
+            items = operations[section](a, b)
+            path = os.path.join(tmpdir, f"{section}.{i}")
+            with open(path, "w", **SPILL_OPTS) as f:
+                for item in items if opts.unsorted else sorted(items):
+                    f.write(item + "\n")
+            runs[section].append(path)
+        del a, b
+
+    combine = chain_runs if opts.unsorted else merge_runs
+    return {section: combine(paths) for section, paths in runs.items()}
+
+
+def compute_masks(inputs):
+    """one pass over every input, mapping each distinct line to a bitmask of
+    the inputs that contain it. Bit i is set for inputs[i]. Masks for up to 8
+    inputs are cached small ints, so they cost no memory beyond the dict."""
+    masks = {}
+    get = masks.get
+    for i, fh in enumerate(inputs):
+        bit = 1 << i
+        for line in read_lines(fh):
+            masks[line] = get(line, 0) | bit
+    return masks
+
+
+def popcount(mask):
+    return bin(mask).count("1")
+
+
+def mask_pattern(mask, n_inputs):
+    return "".join("X" if mask & (1 << i) else "." for i in range(n_inputs))
+
+
+def print_counts(opts, masks):
+    names = [fh.name for fh in opts.inputs]
+    counts = collections.Counter(masks.values())
+    ranked = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))
+
+    if opts.json:
+        rows = [
+            {"inputs": [n for i, n in enumerate(names) if mask & (1 << i)], "count": c}
+            for mask, c in ranked
+        ]
+        print(json.dumps(rows, indent=2))
+    elif opts.table:
+        from tabulate import tabulate
+
+        rows = [list(mask_pattern(mask, len(names))) + [c] for mask, c in ranked]
+        print(tabulate(rows, headers=names + ["count"]))
+    else:
+        for mask, c in ranked:
+            members = ",".join(n for i, n in enumerate(names) if mask & (1 << i))
+            print(f"{c}\t{mask_pattern(mask, len(names))}\t{members}")
+
+
+def run_nway(opts):
+    masks = compute_masks(opts.inputs)
+    logging.debug("%d distinct lines in %d inputs", len(masks), len(opts.inputs))
+
+    if opts.exactly:
+        items = (line for line, mask in masks.items() if mask == opts.exactly)
+    elif opts.at_least is not None:
+        k = opts.at_least
+        items = (line for line, mask in masks.items() if popcount(mask) >= k)
+    else:
+        print_counts(opts, masks)
+        return
+
+    print_join(items if opts.unsorted else sorted(items))
+
+
+class Sketch:
+    """HyperLogLog registers for cardinality plus a bottom-k MinHash for
+    resemblance. Both use one stable 64 bit hash per line, so sketches saved
+    by different runs can be merged and compared."""
+
+    MAGIC = "jset_sketch"
+
+    def __init__(self, precision=14, k=1024, registers=None, mins=()):
+        self.precision = precision
+        self.k = k
+        self.registers = registers or bytearray(1 << precision)
+        # max-heap (negated) of the k smallest hashes, and the same as a set
+        self.heap = [-h for h in mins]
+        heapq.heapify(self.heap)
+        self.members = set(mins)
+
+    @staticmethod
+    def hash(line):
+        digest = hashlib.blake2b(
+            line.encode("utf-8", "surrogateescape"), digest_size=8
+        ).digest()
+        return int.from_bytes(digest, "big")
+
+    def update(self, lines):
+        shift = 64 - self.precision
+        low_mask = (1 << shift) - 1
+        registers = self.registers
+        heap = self.heap
+        members = self.members
+        k = self.k
+        hash = self.hash
+        for line in lines:
+            h = hash(line)
+            idx = h >> shift
+            rank = shift - (h & low_mask).bit_length() + 1
+            if rank > registers[idx]:
+                registers[idx] = rank
+            if h in members:
+                continue
+            if len(heap) < k:
+                heapq.heappush(heap, -h)
+                members.add(h)
+            elif h < -heap[0]:
+                members.discard(-heapq.heapreplace(heap, -h))
+                members.add(h)
+        return self
+
+    @property
+    def mins(self):
+        return sorted(self.members)
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError(
+                f"cannot merge sketches with precision {self.precision} "
+                f"and {other.precision}"
+            )
+        registers = bytearray(map(max, self.registers, other.registers))
+        k = min(self.k, other.k)
+        mins = heapq.nsmallest(k, self.members | other.members)
+        return Sketch(self.precision, k, registers, mins)
+
+    def cardinality(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0**-r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return estimate
+
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def jaccard(self, other):
+        """fraction of the k smallest hashes of the union that are in both"""
+        k = min(self.k, other.k)
+        union_mins = heapq.nsmallest(k, self.members | other.members)
+        if not union_mins:
+            return 0.0, 0.0
+        both = sum(1 for h in union_mins if h in self.members and h in other.members)
+        j = both / len(union_mins)
+        return j, math.sqrt(j * (1 - j) / len(union_mins))
+
+    def to_json(self):
+        return json.dumps(
+            {
+                self.MAGIC: 1,
+                "precision": self.precision,
+                "k": self.k,
+                "registers": base64.b64encode(bytes(self.registers)).decode("ascii"),
+                "mins": self.mins,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        registers = bytearray(base64.b64decode(data["registers"]))
+        return cls(data["precision"], data["k"], registers, data["mins"])
+
+
+def read_sketch(opts, fh):
+    """a saved sketch is loaded as is, any other input is streamed into a new
+    sketch"""
+    first = fh.readline()
+    if first.startswith('{"%s"' % Sketch.MAGIC):
+        return Sketch.from_json(first + fh.read())
+    lines = itertools.chain(read_lines([first]) if first else [], read_lines(fh))
+    return Sketch(opts.precision, opts.sketch_size).update(lines)
+
+
+def save_sketch(sketch, path):
+    with open(path, "w") as f:
+        f.write(sketch.to_json() + "\n")
+
+
+def estimate_overlap(a, b):
+    """estimated sizes with one standard error each"""
+    size_a = a.cardinality()
+    size_b = b.cardinality()
+    union = a.merge(b)
+    size_union = union.cardinality()
+    rel = union.relative_error()
+    j, j_err = a.jaccard(b)
+
+    both = j * size_union
+    both_err = size_union * math.sqrt(j_err**2 + (j * rel) ** 2)
+    return {
+        "a": (size_a, size_a * a.relative_error()),
+        "b": (size_b, size_b * b.relative_error()),
+        "union": (size_union, size_union * rel),
+        "both": (both, both_err),
+        "only_a": (max(size_a - both, 0), math.hypot(size_a * rel, both_err)),
+        "only_b": (max(size_b - both, 0), math.hypot(size_b * rel, both_err)),
+        "jaccard": (j, j_err),
+    }
+
+
+def run_sketches(opts):
+    sketches = [read_sketch(opts, fh) for fh in opts.inputs]
+    if len({sketch.precision for sketch in sketches}) > 1:
+        found = ", ".join(
+            f"{fh.name}: {sketch.precision}" for fh, sketch in zip(opts.inputs, sketches)
+        )
+        sys.exit(f"jset.py: error: sketches need the same --precision, not {found}")
+
+    if opts.save_sketches:
+        os.makedirs(opts.save_sketches, exist_ok=True)
+        for fh, sketch in zip(opts.inputs, sketches):
+            name = os.path.basename(fh.name) + ".sketch"
+            save_sketch(sketch, os.path.join(opts.save_sketches, name))
+
+    if opts.merge_sketches:
+        merged = sketches[0]
+        for sketch in sketches[1:]:
+            merged = merged.merge(sketch)
+        save_sketch(merged, opts.merge_sketches)
+
+    if not opts.estimate:
+        return
+
+    report = estimate_overlap(*sketches)
+    if opts.json:
+        out = {k: {"estimate": v, "stderr": e} for k, (v, e) in report.items()}
+        print(json.dumps(out, indent=2))
+        return
+    for name, (value, err) in report.items():
+        if name == "jaccard":
+            print(f"{name}\t{value:.4f}\t±{err:.4f}")
+        else:
+            print(f"{name}\t{value:.0f}\t±{err:.0f}")
+
+
 def run(opts):
     logging.debug("starting")
-    a = set([line.rstrip("\n") for line in opts.a])
-    b = set([line.rstrip("\n") for line in opts.b])
+    if getattr(opts, "sketching", False):
+        run_sketches(opts)
+    elif getattr(opts, "nway", False):
+        run_nway(opts)
+    elif getattr(opts, "external", False):
+        with tempfile.TemporaryDirectory(prefix="jset.", dir=opts.tmpdir) as tmpdir:
+            write_output(opts, compute_external(opts, tmpdir))
+    elif len(requested_sections(opts)) == 1:
+        write_output(opts, compute_section(opts, requested_sections(opts)[0]))
+    else:
+        write_output(opts, compute_sets(opts))
 
-    out = {
-        "only_a": sorted(list(a - b)),
-        "only_b": sorted(list(b - a)),
-        "both": sorted(list(a.intersection(b))),
-    }
 
+def write_output(opts, out):
     if opts.first:
         print_join(out["only_a"])
     elif opts.second:
@@ -176,13 +724,13 @@ def run(opts):
     elif opts.both:
         print_join(out["both"])
     elif opts.uniq:
-        print_join(out["only_a"] + out["only_b"])
+        print_join(itertools.chain(out["only_a"], out["only_b"]))
     elif opts.json:
-        print(json.dumps(out, indent=2))
+        print_json(out)
     elif opts.table:
-        print_table(out)
+        print_table(opts, out)
     else:
-        for section in ["only_a", "only_b", "both"]:
+        for section in SECTIONS:
             fname = ""
             if section == "only_a":
                 fname = opts.a.name
@@ -0,0 +1,101 @@
+"""
+Helpers shared by dateplot.py and dotplot.py.
+
+matplotlib is imported on first use rather than at import time, so --help and
+argument errors don't pay for it, and the Agg backend is picked when there is
+no display to draw on.
+
+    plt = plotting.pyplot()
+    ...
+    plotting.show(opts.outfile)
+
+and read_values() streams numbers, one per line, as numpy arrays.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Generator, Iterable
+from typing import TYPE_CHECKING
+
+import itertools
+import logging
+import os
+import shutil
+import subprocess
+import sys
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# lines parsed per numpy conversion by read_values()
+CHUNK_SIZE = 100_000
+
+# viewers tried by show(), by sys.platform prefix
+VIEWERS = {"darwin": ["open"], "linux": ["xdg-open"], "win32": ["explorer"]}
+
+
+def has_display() -> bool:
+    if sys.platform in ("darwin", "win32"):
+        return True
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+def pyplot():
+    """matplotlib.pyplot, on the Agg backend when there is no display"""
+    import matplotlib
+
+    if not has_display() and "MPLBACKEND" not in os.environ:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+def show(path: str) -> None:
+    """
+    Open path in the desktop's viewer, without waiting for it. With no display
+    or no viewer, just say where the file is.
+    """
+    viewer = next(
+        (
+            cmd
+            for platform, cmds in VIEWERS.items()
+            if sys.platform.startswith(platform)
+            for cmd in cmds
+            if shutil.which(cmd)
+        ),
+        None,
+    )
+    if viewer is None or not has_display():
+        logging.info("wrote %s", path)
+        return
+
+    cmd = [viewer, path]
+    logging.info(cmd)
+    subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def read_values(lines: Iterable[str], size=CHUNK_SIZE) -> Generator[np.ndarray]:
+    """
+    Parse lines into float arrays, size lines at a time. A chunk with lines
+    that aren't numbers is parsed again line by line, skipping those lines.
+    """
+    import numpy as np
+
+    lines = iter(lines)
+    skipped = 0
+    while chunk := list(itertools.islice(lines, size)):
+        try:
+            yield np.fromiter(map(float, chunk), float, len(chunk))
+            continue
+        except ValueError:
+            pass
+        values = []
+        for line in chunk:
+            try:
+                values.append(float(line))
+            except ValueError:
+                skipped += 1
+        yield np.array(values, dtype=float)
+    if skipped:
+        logging.warning("skipped %d lines that are not numbers", skipped)
@@ -16,6 +16,11 @@ use --date-format to provide a custom date parsing string. See the python strpti
 
 use the --unix-timestamp flag to parse unix (second) and/or java (milliseconds) epoch times.
 
+Input is read and converted 100k lines at a time, with one vectorized
+to_datetime() per chunk. Without --date-format, the format is guessed once
+from the first lines and used for every chunk; a chunk that doesn't match it
+is parsed line by line as mixed formats, which is much slower.
+
 
 Examples:
 
@@ -45,6 +50,39 @@ Examples:
     2024-12-13 00:00:00
 
 
+## Engines
+
+Fixed size buckets (s, min, h, D and their multiples) of epoch times
+(--unix-timestamp), ISO-8601 times, or times in an explicit --date-format are
+floored with plain integer arithmetic on epoch seconds, without importing
+pandas, which saves most of a second per run. pandas is imported to guess
+other formats, for calendar buckets like MS (month start) or W, and for
+buckets under a second. Either way buckets are written like pandas writes a
+Timestamp, with fractions of a second only where there are any, and with the
+UTC offset of times that have one.
+
+
+## Counting and aggregating
+
+Rather than piping the buckets through `sort | uniq -c`, let quantize_times.py
+count them, or sum, average or take the max of a numeric column per bucket.
+One "bucket<TAB>value" row is written per bucket, in bucket order.
+
+    # lines per hour
+    quantize_times.py -b 1h --count access.log.times
+
+    # mean of the 2nd field per 5 minutes, from "2024-08-01T10:11:12 231" lines
+    quantize_times.py -b 5min --agg mean:2 latency.txt
+
+    # "08/01/2024 07:08:30 AM 231": the time is the first 3 fields
+    quantize_times.py --time-fields 3 --agg max:4 latency.txt
+
+With --agg, lines are split on --separator (whitespace by default), the
+timestamp is the first --time-fields fields, and COL counts fields from 1,
+like cut. Only the running totals per bucket are kept. With --sorted, for
+time-ordered input, each bucket is written as soon as a later one starts.
+
+
 ## Limitations
 
 No handling of timezones is provided.
@@ -56,28 +94,80 @@ No handling of timezones is provided.
 
 """
 
-import pandas as pd
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
 
 import argparse
 import fileinput
+import functools
+import itertools
+import logging
+import math
+import re
+import sys
+import time
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# lines per vectorized conversion
+CHUNK_SIZE = 100_000
+OUTPUT_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+EPOCH = datetime(1970, 1, 1)
+# fixed bucket sizes floored without pandas, in seconds
+BUCKET_UNITS = {'s': 1, 'min': 60, 'h': 3600, 'D': 86400}
+# old pandas aliases, which pandas 3 rejects
+UNIT_ALIASES = {'S': 's', 'T': 'min', 'H': 'h', 'L': 'ms', 'U': 'us', 'N': 'ns'}
+ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}(:?\d{2})?)?$')
+
+
+def aggregation(value):
+    m = re.match(r'^(sum|mean|max):(\d+)$', value)
+    if not m or int(m.group(2)) < 1:
+        raise argparse.ArgumentTypeError(f'{value} is not sum, mean or max:COL, e.g. sum:2')
+    return m.group(1), int(m.group(2))
+
+
+def bucket_frequency(value):
+    """value with an old unit alias like 4H spelled the current way, 4h"""
+    m = re.match(r'^(\d*)\s*([a-zA-Z]+)$', value.strip())
+    if m and m.group(2) in UNIT_ALIASES:
+        return m.group(1) + UNIT_ALIASES[m.group(2)]
+    return value
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Quantize date/time stamps to specified bucket size.")
-    parser.add_argument("--bucket_size", "-b", type=str, default='4H',
-                        help="The size of the time bucket (e.g., '4H', '2D','30min'). default: %(default)s")
+    parser.add_argument("--bucket_size", "-b", type=bucket_frequency, default='4h',
+                        help="The size of the time bucket (e.g., '4h', '2D','30min'). default: %(default)s")
     group = parser.add_mutually_exclusive_group()
     group.add_argument('--date-format', '-d', type=str,
                        help='Custom date format for parsing ' +
                             ' (e.g., "%%m/%%d/%%Y %%I:%%M:%%S %%p").')
     group.add_argument('--unix-timestamp', '-u', action='store_true',
                        help='Indicate that the input dates are Unix timestamps.')
+    agg = parser.add_mutually_exclusive_group()
+    agg.add_argument('--count', '-c', action='store_true',
+                     help='write the number of lines per bucket')
+    agg.add_argument('--agg', '-a', type=aggregation, metavar='FUNC:COL',
+                     help='write the sum, mean or max of field COL per bucket, e.g. sum:2')
+    parser.add_argument('--separator', '-s',
+                        help='field separator for --agg. default: whitespace')
+    parser.add_argument('--time-fields', '-t', type=int, default=1,
+                        help='number of leading fields in the timestamp, for --agg. default: %(default)s')
+    parser.add_argument('--sorted', action='store_true',
+                        help='input is in time order, write each bucket when the next one starts')
     parser.add_argument('files', nargs='*', help='Files to read from (if empty, stdin is used).')
 
     return parser.parse_args()
 
 
 def quantize_datetime(date_str, bucket_size, date_format=None, unix_timestamp=False):
+    import pandas as pd
+
     if unix_timestamp:
         # Check if the timestamp is in seconds (10 digits) or milliseconds (13 digits)
         timestamp_length = len(date_str)
@@ -95,13 +185,354 @@ def quantize_datetime(date_str, bucket_size, date_format=None, unix_timestamp=Fa
     return date.floor(bucket_size)
 
 
+def parse_unix(values: pd.Series) -> pd.Series:
+    """seconds (up to 11 digits) and milliseconds (12-14 digits), mixed freely"""
+    import pandas as pd
+
+    lengths = values.str.len()
+    bad = (lengths < 7) | (lengths > 14) | ~values.str.isdigit()
+    if bad.any():
+        raise ValueError(f"Invalid Unix timestamp length. Should be 8-14 digits: {values[bad].iloc[0]}")
+    epochs = values.astype('int64')
+    millis = epochs.where(lengths > 11, epochs * 1000)
+    return pd.to_datetime(millis, unit='ms')
+
+
+class Buckets:
+    """
+    Line count, sum and max of the values per bucket, merged in a chunk at a
+    time. Only these totals are kept, never the lines.
+    """
+
+    def __init__(self):
+        self.totals = {}
+        self.closed = None
+        self.warned = False
+
+    def add(self, buckets: pd.Series, values: pd.Series | None = None) -> None:
+        import pandas as pd
+
+        if values is None:
+            values = pd.Series(0.0, index=buckets.index)
+        frame = pd.DataFrame({'bucket': buckets, 'value': values})
+        grouped = frame.groupby('bucket')['value'].agg(['size', 'count', 'sum', 'max'])
+        if self.closed is not None and len(grouped) and grouped.index[0] <= self.closed:
+            if not self.warned:
+                logging.warning('input is not in time order, %s is written again', grouped.index[0])
+                self.warned = True
+        for bucket, lines, count, total, high in grouped.itertuples():
+            if bucket not in self.totals:
+                self.totals[bucket] = [lines, count, total, high]
+                continue
+            totals = self.totals[bucket]
+            totals[0] += lines
+            totals[1] += count
+            totals[2] += total
+            if pd.isna(totals[3]) or high > totals[3]:
+                totals[3] = high
+
+    def add_value(self, bucket, value: float | None = None) -> None:
+        """one line, for the stdlib engine"""
+        if bucket is None:
+            return
+        if self.closed is not None and bucket <= self.closed and not self.warned:
+            logging.warning('input is not in time order, %s is written again', format_bucket(bucket))
+            self.warned = True
+        totals = self.totals.get(bucket)
+        if totals is None:
+            totals = self.totals[bucket] = [0, 0, 0.0, math.nan]
+        totals[0] += 1
+        if value is not None and not math.isnan(value):
+            totals[1] += 1
+            totals[2] += value
+            if not totals[3] >= value:
+                totals[3] = value
+
+    def pop_before(self, bucket=None):
+        """remove and yield the buckets before bucket, or all of them, in order"""
+        done = sorted(b for b in self.totals if bucket is None or b < bucket)
+        for b in done:
+            yield b, self.totals.pop(b)
+        if done:
+            self.closed = done[-1]
+
+
+def format_number(value) -> str:
+    if math.isnan(value):
+        return 'nan'
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def bucket_rows(items, agg=None) -> list[str]:
+    rows = []
+    for bucket, (lines, count, total, high) in items:
+        if agg is None:
+            value = str(lines)
+        elif agg[0] == 'sum':
+            value = format_number(total)
+        elif agg[0] == 'mean':
+            value = format_number(total / count if count else float('nan'))
+        else:
+            value = format_number(high)
+        rows.append(f'{format_bucket(bucket)}\t{value}\n')
+    return rows
+
+
+def sniff_format(values: pd.Series, sample=1000) -> str:
+    """
+    A format guessed from values spread over the chunk that parses a sample of
+    them, or 'mixed' to have each value guessed on its own. guess_datetime_format
+    gives up on some values, like 12 AM, so a few are tried.
+    """
+    import pandas as pd
+    from pandas.tseries.api import guess_datetime_format
+
+    values = values[values != '']
+    values = values.iloc[:: max(1, len(values) // sample)]
+    for value in values.iloc[:: max(1, len(values) // 20)]:
+        date_format = guess_datetime_format(value)
+        if date_format is None:
+            continue
+        try:
+            pd.to_datetime(values, format=date_format)
+        except ValueError:
+            continue
+        return date_format
+    return 'mixed'
+
+
+def parse_dates(values: pd.Series, date_format: str, guessed=False) -> pd.Series:
+    import pandas as pd
+
+    try:
+        return pd.to_datetime(values, format=date_format)
+    except ValueError:
+        if not guessed:
+            raise
+    return pd.to_datetime(values, format='mixed')
+
+
+def split_fields(lines: list[str], opts) -> tuple[pd.Series, pd.Series | None]:
+    """the timestamp text of each line, and with --agg the values of its column"""
+    import pandas as pd
+
+    values = pd.Series(lines, dtype=str).str.strip()
+    if not opts.agg:
+        return values, None
+    fields = values.str.split(opts.separator, expand=True)
+    if opts.agg[1] > fields.shape[1]:
+        raise ValueError(f'no field {opts.agg[1]} in: {lines[0].strip()}')
+    times = fields[0]
+    if opts.time_fields > 1:
+        times = times.str.cat([fields[i] for i in range(1, opts.time_fields)], sep=' ')
+    return times, pd.to_numeric(fields[opts.agg[1] - 1], errors='coerce')
+
+
+def floor_times(times: pd.Series, opts, date_format=None) -> pd.Series:
+    if opts.unix_timestamp:
+        dates = parse_unix(times)
+    else:
+        guessed = not opts.date_format
+        dates = parse_dates(times, opts.date_format or date_format, guessed)
+    return floor_dates(dates, opts.bucket_size)
+
+
+def floor_dates(dates: pd.Series, bucket_size: str) -> pd.Series:
+    """
+    dt.floor(), which only takes fixed frequencies. Calendar buckets like MS or
+    W are floored by rolling forward to the next bucket and back one.
+    """
+    from pandas.tseries.frequencies import to_offset
+
+    offset = to_offset(bucket_size)
+    try:
+        return dates.dt.floor(offset)
+    except ValueError:
+        pass
+    return dates.dt.normalize() + offset - offset
+
+
+def format_dates(dates: pd.Series) -> pd.Series:
+    """
+    dates written like str(Timestamp): microseconds, or nanoseconds, only
+    where there are any, and the UTC offset of tz-aware dates.
+    """
+    text = dates.dt.strftime(OUTPUT_FORMAT)
+    micros = dates.dt.microsecond.fillna(0) != 0
+    nanos = dates.dt.nanosecond.fillna(0) != 0
+    if micros.any() or nanos.any():
+        text = text.mask(micros | nanos, text + dates.dt.strftime('.%f'))
+        if nanos.any():
+            text[nanos] += dates.dt.nanosecond[nanos].astype(int).map('{:03d}'.format)
+    if dates.dt.tz is not None:
+        offset = dates.dt.strftime('%z')
+        text += offset.str[:3] + ':' + offset.str[3:]
+    return text.fillna('NaT')
+
+
+def quantize_chunk(lines: list[str], opts, date_format=None) -> list[str]:
+    times, _ = split_fields(lines, opts)
+    floored = floor_times(times, opts, date_format)
+    return format_dates(floored).tolist()
+
+
+def bucket_seconds(bucket_size: str) -> int | None:
+    """the size of a fixed bucket like 4h in seconds, or None for pandas to handle"""
+    m = re.match(r'^(\d*)\s*([a-zA-Z]+)$', bucket_size.strip())
+    if not m or m.group(2) not in BUCKET_UNITS:
+        return None
+    return int(m.group(1) or 1) * BUCKET_UNITS[m.group(2)]
+
+
+@functools.lru_cache(maxsize=4096)
+def format_seconds(seconds: int) -> str:
+    return time.strftime(OUTPUT_FORMAT, time.gmtime(seconds))
+
+
+def format_bucket(bucket) -> str:
+    if bucket is None:
+        return 'NaT'
+    if isinstance(bucket, int):
+        return format_seconds(bucket)
+    return str(bucket)
+
+
+def unix_seconds(text: str) -> float:
+    if not text.isdigit() or not 7 <= len(text) <= 14:
+        raise ValueError(f"Invalid Unix timestamp length. Should be 8-14 digits: {text}")
+    return int(text) if len(text) <= 11 else int(text) / 1000
+
+
+def wall_seconds(date: datetime) -> int:
+    """whole seconds from the epoch to the wall clock time of date"""
+    delta = date.replace(tzinfo=None) - EPOCH
+    return delta.days * 86400 + delta.seconds
+
+
+def stdlib_parser(opts):
+    if opts.unix_timestamp:
+        return unix_seconds
+    if opts.date_format:
+        date_format = opts.date_format
+        return lambda text: datetime.strptime(text, date_format)
+    return datetime.fromisoformat
+
+
+def stdlib_fields(lines: list[str], opts) -> tuple[list[str], list[float] | None]:
+    """split_fields() without pandas"""
+    times = [line.strip() for line in lines]
+    if not opts.agg:
+        return times, None
+    n, col = opts.time_fields, opts.agg[1]
+    values = []
+    for i, line in enumerate(times):
+        fields = line.split(opts.separator)
+        times[i] = ' '.join(fields[:n])
+        try:
+            values.append(float(fields[col - 1]))
+        except (IndexError, ValueError):
+            values.append(math.nan)
+    return times, values
+
+
+@functools.lru_cache(maxsize=4096)
+def offset_bucket(seconds: int, tz) -> datetime:
+    return (EPOCH + timedelta(seconds=seconds)).replace(tzinfo=tz)
+
+
+def stdlib_floor(times: list[str], parse, size: int) -> list[int | datetime | None]:
+    """
+    Floor each time to a multiple of size seconds of its wall clock time, like
+    pandas floors datetimes. Buckets are epoch seconds, or datetimes for times
+    with a UTC offset. Blank times are None, which pandas writes as NaT.
+    """
+    if parse is unix_seconds:
+        return [int(parse(text) // size) * size for text in times]
+    buckets = []
+    for text in times:
+        if not text:
+            buckets.append(None)
+            continue
+        date = parse(text)
+        if date.tzinfo is None:
+            # wall_seconds(), inlined for the common case
+            delta = date - EPOCH
+            buckets.append((delta.days * 86400 + delta.seconds) // size * size)
+        else:
+            buckets.append(offset_bucket(wall_seconds(date) // size * size, date.tzinfo))
+    return buckets
+
+
+def pandas_seconds(floored: pd.Series) -> list[int | datetime | None]:
+    """pandas results in the stdlib engine's form"""
+    import pandas as pd
+
+    if floored.dt.tz is not None:
+        return [None if date is pd.NaT else date.to_pydatetime() for date in floored]
+    seconds = (floored - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+    return [None if math.isnan(s) else int(s) for s in seconds.astype(float).tolist()]
+
+
+def use_stdlib(times: list[str], opts, size: int | None) -> bool:
+    if size is None:
+        return False
+    if opts.unix_timestamp or opts.date_format:
+        return True
+    first = next((text for text in times if text), '')
+    return bool(ISO_DATE.match(first))
+
+
 def run(opts):
-    for line in fileinput.input(opts.files):
-        quantized_date = quantize_datetime(line,
-                                           bucket_size=opts.bucket_size,
-                                           date_format=opts.date_format,
-                                           unix_timestamp=opts.unix_timestamp)
-        print(quantized_date)
+    lines = fileinput.input(opts.files)
+    size = bucket_seconds(opts.bucket_size)
+    stdlib = None
+    date_format = None
+    buckets = Buckets() if opts.count or opts.agg else None
+    while chunk := list(itertools.islice(lines, CHUNK_SIZE)):
+        if stdlib is None:
+            stdlib = use_stdlib(stdlib_fields(chunk[:100], opts)[0], opts, size)
+            logging.debug('engine: %s', 'stdlib' if stdlib else 'pandas')
+            parse = stdlib_parser(opts)
+
+        if stdlib:
+            times, values = stdlib_fields(chunk, opts)
+            try:
+                floored = stdlib_floor(times, parse, size)
+            except ValueError:
+                if opts.unix_timestamp or opts.date_format:
+                    raise
+                # not all ISO-8601 after all, guess the format with pandas
+                pandas_times, _ = split_fields(chunk, opts)
+                date_format = date_format or sniff_format(pandas_times)
+                floored = pandas_seconds(floor_times(pandas_times, opts, date_format))
+
+            if buckets is None:
+                sys.stdout.write('\n'.join(map(format_bucket, floored)) + '\n')
+                continue
+            add_value = buckets.add_value
+            for bucket, value in zip(floored, values or itertools.repeat(None)):
+                add_value(bucket, value)
+            if opts.sorted:
+                latest = max((b for b in floored if b is not None), default=None)
+                sys.stdout.writelines(bucket_rows(buckets.pop_before(latest), opts.agg))
+            continue
+
+        times, values = split_fields(chunk, opts)
+        if date_format is None and not opts.date_format and not opts.unix_timestamp:
+            # guessed once, as if it had been given with --date-format
+            date_format = sniff_format(times)
+        floored = floor_times(times, opts, date_format)
+
+        if buckets is None:
+            text = format_dates(floored)
+            sys.stdout.write('\n'.join(text.tolist()) + '\n')
+            continue
+        buckets.add(floored, values)
+        if opts.sorted:
+            sys.stdout.writelines(bucket_rows(buckets.pop_before(floored.max()), opts.agg))
+
+    if buckets is not None:
+        sys.stdout.writelines(bucket_rows(buckets.pop_before(), opts.agg))
 
 
 if __name__ == '__main__':
@@ -13,18 +13,93 @@ becomes
 {"day": "2023-05-25", "dayOfWeek": "Thu", "week": "2023-05-22", "weekend": "NULL", "holiday": "NULL"}
 
 
-Note that you can use mlr --n2x to get a nice long output version
+With -t, each row is written the long way instead, one "name value" line
+per column and a blank line between rows, like mlr --n2x:
+
+day       2023-05-25
+dayOfWeek Thu
+week      2023-05-22
+weekend   NULL
+holiday   NULL
+
+The input may hold several tables, in any of the layouts tabletext.py
+recognizes (spark, psql, grid, markdown, simple). Rows of every table are
+written as one JSONL stream, or each table to its own file with --split.
+
+With --infer-types, the first rows of each table are sampled to pick a type
+per column (int, float, bool, date, datetime, or string). The rest of the
+table is converted with one converter per column, with the --null sentinels
+(and empty fields of typed columns) becoming null:
+
+{"day": "2023-05-25", "dayOfWeek": "Thu", "week": "2023-05-22", "weekend": null, "holiday": null}
+
+With pyarrow installed, --output-format parquet or arrow writes typed
+columns to one file per table in the --split folder.
 
 See also: untabulate.py
 
 """
 
+from collections import namedtuple
+from collections.abc import Callable, Generator
+from datetime import date, datetime
+from json.encoder import encode_basestring_ascii
+from pathlib import Path
+
 import argparse
+import functools
+import itertools
 import json
 import logging
+import operator
 import re
 import sys
 
+from tabletext import Table, read_tables
+
+# rows per record batch in parquet and arrow output
+BATCH_SIZE = 65_536
+
+ColumnType = namedtuple("ColumnType", ["name", "pattern", "to_json", "to_python"])
+
+BOOLS = {"true": True, "t": True, "false": False, "f": False}
+
+
+def parse_bool(value: str) -> bool:
+    return BOOLS[value.lower()]
+
+
+# checked in order, the first type that matches every sampled value wins.
+# Leading zeros keep values like zip codes and ids as strings.
+COLUMN_TYPES = [
+    ColumnType(
+        "bool",
+        re.compile(r"^(true|false|t|f)$", re.I),
+        lambda v: "true" if parse_bool(v) else "false",
+        parse_bool,
+    ),
+    ColumnType("int", re.compile(r"^[-+]?(0|[1-9]\d*)$"), lambda v: str(int(v)), int),
+    ColumnType(
+        "float",
+        re.compile(r"^[-+]?((0|[1-9]\d*)(\.\d*)?|\.\d+)([eE][-+]?\d+)?$"),
+        lambda v: json.dumps(float(v)),
+        float,
+    ),
+    ColumnType(
+        "date",
+        re.compile(r"^\d{4}-\d{2}-\d{2}$"),
+        lambda v: encode_basestring_ascii(date.fromisoformat(v).isoformat()),
+        date.fromisoformat,
+    ),
+    ColumnType(
+        "datetime",
+        re.compile(r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?$"),
+        lambda v: encode_basestring_ascii(datetime.fromisoformat(v).isoformat()),
+        datetime.fromisoformat,
+    ),
+]
+STRING = ColumnType("string", None, encode_basestring_ascii, str)
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Parse fixed-width columns to JSON")
@@ -35,55 +110,225 @@ def parse_args() -> argparse.Namespace:
         default=sys.stdin,
         help="Input file containing fixed-width formatted data. Defaults to STDIN if not provided.",
     )
+    parser.add_argument(
+        "-s",
+        "--split",
+        metavar="FOLDER",
+        help="write each table to a numbered file in FOLDER",
+    )
     parser.add_argument(
         "-t",
         "--table",
         action="store_true",
         help="output data in long table format instead of json",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "-i",
+        "--infer-types",
+        action="store_true",
+        help="convert fields to the column types found in the first rows",
+    )
+    parser.add_argument(
+        "--sample",
+        type=int,
+        default=1000,
+        help="rows sampled per table by --infer-types. default: %(default)s",
+    )
+    parser.add_argument(
+        "--null",
+        default="NULL,null,None,\\N",
+        help="comma separated values that --infer-types writes as null. "
+        "default: %(default)s",
+    )
+    parser.add_argument(
+        "-F",
+        "--output-format",
+        choices=["jsonl", "parquet", "arrow"],
+        default="jsonl",
+        help="typed output format, parquet and arrow need pyarrow and --split. "
+        "default: %(default)s",
+    )
+    opts = parser.parse_args()
 
+    opts.nulls = set(opts.null.split(","))
+    if opts.output_format != "jsonl":
+        opts.infer_types = True
+        if not opts.split:
+            parser.error(f"--output-format {opts.output_format} needs --split")
+    if opts.infer_types and opts.table:
+        parser.error("--infer-types does not apply to -t output")
+    return opts
 
-def split_fixed(line, ranges, rstrip=True, lstrip=False) -> list[str]:
-    fields = []
-    for start, end in ranges:
-        field = line[start:end]
-        if rstrip:
-            field = field.rstrip()
-        if lstrip:
-            field = field.lstrip()
-        fields.append(field)
-    return fields
 
+def infer_type(values: list[str], nulls: set[str]) -> ColumnType:
+    values = [v.strip() for v in values]
+    values = [v for v in values if v and v not in nulls]
+    if not values:
+        return STRING
+    for column_type in COLUMN_TYPES:
+        if all(column_type.pattern.match(v) for v in values):
+            return column_type
+    return STRING
 
-def main(opts) -> None:
-    lines = [line.strip() for line in opts.input_file if not line.startswith("+-")]
 
-    header = lines[0]
-    column_names = [name.strip() for name in header.split("|")]
+def sample_types(table: Table, opts) -> tuple[list[ColumnType], Table]:
+    """
+    Infer column types from the first --sample rows, and return them along
+    with a table that still yields every row, sampled ones included.
+    """
+    sample = list(itertools.islice(table.rows, opts.sample))
+    columns = itertools.zip_longest(*sample, fillvalue="")
+    types = [infer_type(list(values), opts.nulls) for values in columns]
+    types += [STRING] * (len(table.header) - len(types))
+    logging.debug("types: %s", [t.name for t in types])
+    rows = itertools.chain(sample, table.rows)
+    return types[: len(table.header)], Table(table.layout, table.header, rows)
+
+
+def converter(column_type: ColumnType, name: str, nulls: set[str], to_json=True):
+    """
+    Build the function that converts one column's fields, once per column.
+    A field the sample didn't anticipate is written as a string in JSON, and
+    as null in typed formats, with a warning.
+    """
+    convert = column_type.to_json if to_json else column_type.to_python
+    null = "null" if to_json else None
+    fallback = encode_basestring_ascii if to_json else lambda v: None
+
+    if column_type is STRING:
+        return lambda v: null if v in nulls else convert(v)
+
+    warned = False
+
+    def convert_field(value: str):
+        nonlocal warned
+        value = value.strip()
+        if not value or value in nulls:
+            return null
+        try:
+            return convert(value)
+        except (ValueError, KeyError):
+            if not warned:
+                logging.warning("%s: %r is not %s", name, value, column_type.name)
+                warned = True
+            return fallback(value)
+
+    return convert_field
 
-    # remove the empty first column from the initial '|'
-    column_names = column_names[1:]
 
-    # Find all positions of the '|' character
-    positions = [match.start() for match in re.finditer(r"\|", header)]
+def jsonl_lines(table, encoders: list[Callable] | None = None) -> Generator[str]:
+    """
+    The same objects as json.dumps(dict(zip(header, fields))), but the
+    '"name": ' prefixes are encoded once per table and each row only encodes
+    its values, with the per column encoders if given.
+    """
+    if len(set(table.header)) != len(table.header):
+        # duplicate names collapse in a dict, so keep the last of each
+        header = dict.fromkeys(table.header)
+        last = {name: i for i, name in enumerate(table.header)}
+        keep = [last[name] for name in header]
+        table = Table(
+            table.layout,
+            list(header),
+            ([f[i] for i in keep if i < len(f)] for f in table.rows),
+        )
+        if encoders:
+            encoders = [encoders[i] for i in keep]
 
-    # Create the ranges by pairing the positions
-    logging.debug("headers: %s", column_names)
+    prefixes = [encode_basestring_ascii(name) + ": " for name in table.header]
+    if encoders:
+        for fields in table.rows:
+            values = [encode(v) for encode, v in zip(encoders, fields)]
+            yield "{" + ", ".join(map(operator.add, prefixes, values)) + "}\n"
+        return
 
-    ranges = [(positions[i] + 1, positions[i + 1]) for i in range(len(positions) - 1)]
-    logging.debug("ranges: %s", ranges)
+    for fields in table.rows:
+        pairs = map(operator.add, prefixes, map(encode_basestring_ascii, fields))
+        yield "{" + ", ".join(pairs) + "}\n"
 
-    parsed = [split_fixed(line, ranges) for line in lines[1:]]
-    kv = [dict(zip(column_names, fields)) for fields in parsed]
 
-    if opts.table:
-        logging.error("tables not supported yet. Use mlr --n2x")
+def typed_jsonl_lines(table, opts) -> Generator[str]:
+    types, table = sample_types(table, opts)
+    encoders = [converter(t, name, opts.nulls) for t, name in zip(types, table.header)]
+    yield from jsonl_lines(table, encoders)
+
+
+def write_arrow(table, opts, path: Path) -> None:
+    """typed columns to a parquet or arrow file, a record batch at a time"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        logging.error("--output-format %s needs pyarrow", opts.output_format)
         sys.exit(1)
 
-    ## JSON output
-    for row in kv:
-        print(json.dumps(row))
+    arrow_types = {
+        "bool": pa.bool_(),
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "date": pa.date32(),
+        "datetime": pa.timestamp("us"),
+        "string": pa.string(),
+    }
+    types, table = sample_types(table, opts)
+    # a dict keeps the last of duplicate names, like the JSON output
+    columns = {name: i for i, name in enumerate(table.header)}
+    schema = pa.schema(
+        [(name, arrow_types[types[i].name]) for name, i in columns.items()]
+    )
+    converters = [
+        converter(types[i], name, opts.nulls, to_json=False)
+        for name, i in columns.items()
+    ]
+
+    if opts.output_format == "parquet":
+        writer = pq.ParquetWriter(path, schema)
+    else:
+        writer = pa.ipc.new_file(path, schema)
+    with writer:
+        while batch := list(itertools.islice(table.rows, BATCH_SIZE)):
+            fields = list(itertools.zip_longest(*batch, fillvalue=""))
+            fields += [("",) * len(batch)] * (len(table.header) - len(fields))
+            arrays = [
+                pa.array(list(map(convert, fields[i])), type=field.type)
+                for convert, i, field in zip(converters, columns.values(), schema)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+
+def long_lines(table) -> Generator[str]:
+    width = max(map(len, table.header), default=0)
+    labels = [name.ljust(width) + " " for name in table.header]
+    for n, fields in enumerate(table.rows):
+        if n:
+            yield "\n"
+        for label, field in zip(labels, fields):
+            yield (label + field).rstrip() + "\n"
+
+
+def main(opts) -> None:
+    format_lines = long_lines if opts.table else jsonl_lines
+    suffix = ".txt" if opts.table else ".jsonl"
+    if opts.infer_types:
+        format_lines = functools.partial(typed_jsonl_lines, opts=opts)
+    if opts.output_format != "jsonl":
+        suffix = "." + opts.output_format
+
+    # spark pads on the right only, so leading whitespace is kept
+    tables = read_tables(opts.input_file, strip=str.rstrip)
+    for n, table in enumerate(tables):
+        if opts.split:
+            outfile = Path(opts.split) / f"{n + 1:02}{suffix}"
+            if opts.output_format != "jsonl":
+                write_arrow(table, opts, outfile)
+            else:
+                with open(outfile, "w") as handle:
+                    handle.writelines(format_lines(table))
+            logging.info("wrote %s", outfile)
+        else:
+            if n and opts.table:
+                sys.stdout.write("\n")
+            sys.stdout.writelines(format_lines(table))
 
 
 if __name__ == "__main__":
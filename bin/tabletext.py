@@ -0,0 +1,275 @@
+"""
+Streaming reader for pretty-printed tables in text, shared by untabulate.py
+and table-parser.py.
+
+Recognized layouts:
+
+    psql          +----+----+ borders around | a | b | cells (tabulate psql)
+    spark         the same borders around |a  |b  | cells (dataframe.show())
+    grid          +====+ under the header and a border between rows
+    psql-aligned  native psql output, a ----+---- rule and a (N rows) footer
+    markdown      | a | b | with a |---|:--:| rule under the header
+    simple        tabulate simple, a rule of dash runs under the header, or
+                  above and below the rows when there is no header
+
+Any number of tables may appear in one input, with other text between them.
+The input is read once, and rows are yielded as their lines are read.
+
+    for table in read_tables(sys.stdin):
+        print(table.layout, table.header)
+        for row in table.rows:
+            ...
+"""
+
+from collections import deque, namedtuple
+from collections.abc import Callable, Generator, Iterable
+import logging
+import operator
+import re
+
+Row = list[str]
+SlicePlan = list[slice]
+Table = namedtuple("Table", ["layout", "header", "rows"])
+
+# lines per block in bulk mode
+BLOCK_SIZE = 10_000
+
+BORDER = re.compile(r"^\+[-=]+(\+[-=]+)*\+\s*$")
+MARKDOWN_ROW = re.compile(r"^\s*\|.*\|\s*$")
+MARKDOWN_RULE = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+PSQL_RULE = re.compile(r"^-+(\+-+)+\s*$")
+PSQL_FOOTER = re.compile(r"^\(\d+ rows?\)\s*$")
+SIMPLE_RULE = re.compile(r"^\s*-+( +-+)*\s*$")
+
+
+class Lines:
+    """
+    A line iterator that can look ahead and push lines back. Only peek
+    between loops over it; inside a loop, pushback() and break instead.
+    """
+
+    def __init__(self, lines: Iterable[str]):
+        self._lines = iter(lines)
+        self._ahead: deque[str] = deque()
+
+    def __iter__(self) -> Generator[str]:
+        while self._ahead:
+            yield self._ahead.popleft()
+        # not "yield from", which would close the input along with a loop
+        # that stopped early
+        for line in self._lines:
+            yield line
+
+    def peek(self, n=0) -> str | None:
+        while len(self._ahead) <= n:
+            line = next(self._lines, None)
+            if line is None:
+                return None
+            self._ahead.append(line)
+        return self._ahead[n]
+
+    def pushback(self, line: str) -> None:
+        self._ahead.appendleft(line)
+
+    def skip(self) -> str | None:
+        return self._ahead.popleft() if self._ahead else next(self._lines, None)
+
+
+def compile_slice_plan(border: str) -> SlicePlan:
+    """
+    Turn a +----+-----+ border line into one slice per column, so the column
+    boundaries are computed once rather than on every data line.
+    """
+    plan: SlicePlan = []
+    start = 1
+    for width in (len(x) for x in border.split("+")[1:-1]):
+        plan.append(slice(start, start + width))
+        start += width + 1
+    return plan
+
+
+def runs_slice_plan(rule: str) -> SlicePlan:
+    """
+    Slices for a rule made of dash runs, such as ----+---- (psql) or
+    ----  ---- (simple). Each column stops before the character ahead of the
+    next run, where psql puts its |, and the last column runs to the end of
+    the line.
+    """
+    starts = [m.start() for m in re.finditer(r"-+", rule)]
+    return [slice(start, end - 1) for start, end in zip(starts, starts[1:])] + [
+        slice(starts[-1], None)
+    ]
+
+
+def split_line(line: str, plan: SlicePlan, strip=str.strip) -> Row:
+    return [strip(line[cols]) for cols in plan]
+
+
+def split_block(lines: list[str], getters, strip=str.strip) -> Iterable[Row]:
+    """
+    Split a block of data lines column by column. Slicing and stripping each
+    column is a map() over the whole block, which keeps the per-field work
+    out of the Python interpreter loop.
+    """
+    columns = [map(strip, map(get, lines)) for get in getters]
+    return map(list, zip(*columns))
+
+
+def read_bordered(lines: Lines, strip, bulk) -> Table:
+    border = lines.skip()
+    cells = lines.skip().rstrip("\n").split("|")[1:-1]
+    header = [x.strip() for x in cells]
+    plan = compile_slice_plan(border)[: len(header)]
+
+    layout = "spark" if all(not c.startswith(" ") for c in cells) else "psql"
+    rule = lines.peek()
+    if rule is not None and BORDER.match(rule):
+        lines.skip()
+        if "=" in rule:
+            layout = "grid"
+    logging.debug("%s table: %s %s", layout, header, plan)
+
+    def row_lines() -> Generator[str]:
+        # a border ends the table unless another row follows it (grid)
+        bordered = False
+        for line in lines:
+            if line.startswith("|"):
+                bordered = False
+                yield line
+            elif not bordered and BORDER.match(line):
+                bordered = True
+            else:
+                lines.pushback(line)
+                return
+
+    def rows() -> Generator[Row]:
+        # row_lines() inlined, as this is the per-line hot loop
+        bordered = False
+        for line in lines:
+            if line.startswith("|"):
+                bordered = False
+                yield [strip(line[cols]) for cols in plan]
+            elif not bordered and BORDER.match(line):
+                bordered = True
+            else:
+                lines.pushback(line)
+                return
+
+    def bulk_rows() -> Generator[Row]:
+        getters = [operator.itemgetter(cols) for cols in plan]
+        block = []
+        for line in row_lines():
+            block.append(line)
+            if len(block) >= BLOCK_SIZE:
+                yield from split_block(block, getters, strip)
+                block = []
+        yield from split_block(block, getters, strip)
+
+    return Table(layout, header, bulk_rows() if bulk else rows())
+
+
+def read_psql_aligned(lines: Lines) -> Table:
+    header_line = lines.skip()
+    plan = runs_slice_plan(lines.skip())
+    header = split_line(header_line, plan)
+    logging.debug("psql-aligned table: %s %s", header, plan)
+
+    def rows() -> Generator[Row]:
+        for line in lines:
+            if PSQL_FOOTER.match(line):
+                return
+            if not line.strip():
+                lines.pushback(line)
+                return
+            yield split_line(line, plan)
+
+    return Table("psql-aligned", header, rows())
+
+
+def split_markdown(line: str) -> Row:
+    return [x.strip() for x in line.strip().strip("|").split("|")]
+
+
+def read_markdown(lines: Lines) -> Table:
+    header = split_markdown(lines.skip())
+    lines.skip()
+    logging.debug("markdown table: %s", header)
+
+    def rows() -> Generator[Row]:
+        for line in lines:
+            if not MARKDOWN_ROW.match(line):
+                lines.pushback(line)
+                return
+            yield split_markdown(line)
+
+    return Table("markdown", header, rows())
+
+
+def read_simple(lines: Lines, has_header: bool) -> Table:
+    header_line = lines.skip() if has_header else None
+    plan = runs_slice_plan(lines.skip())
+    if has_header:
+        header = split_line(header_line, plan)
+    else:
+        header = [f"col{i + 1}" for i in range(len(plan))]
+    logging.debug("simple table: %s %s", header, plan)
+
+    def rows() -> Generator[Row]:
+        # a closing rule is consumed, a blank line is left for the caller
+        for line in lines:
+            if SIMPLE_RULE.match(line):
+                return
+            if not line.strip():
+                lines.pushback(line)
+                return
+            yield split_line(line, plan)
+
+    return Table("simple", header, rows())
+
+
+def start_table(lines: Lines, strip, bulk) -> Table | None:
+    """detect a table starting at the next line, from that line and the one after"""
+    line = lines.peek()
+    following = lines.peek(1)
+    if following is None:
+        return None
+
+    if BORDER.match(line) and following.startswith("|"):
+        return read_bordered(lines, strip, bulk)
+    if MARKDOWN_ROW.match(line) and "|" in following and MARKDOWN_RULE.match(following):
+        return read_markdown(lines)
+    if "|" in line and PSQL_RULE.match(following):
+        return read_psql_aligned(lines)
+    if line.strip() and not SIMPLE_RULE.match(line) and SIMPLE_RULE.match(following):
+        return read_simple(lines, has_header=True)
+    if (
+        SIMPLE_RULE.match(line)
+        and len(line.split()) > 1
+        and following.strip()
+        and not SIMPLE_RULE.match(following)
+    ):
+        return read_simple(lines, has_header=False)
+    return None
+
+
+def read_tables(
+    input_lines: Iterable[str], strip: Callable[[str], str] = str.strip, bulk=False
+) -> Generator[Table]:
+    """
+    Yield each table found in input_lines. Read a table's rows before moving
+    to the next table; any rows left unread are skipped. Lines that are not
+    part of a table are ignored. strip is applied to the fields of bordered
+    tables; the other layouts are always stripped on both sides.
+    """
+    lines = Lines(input_lines)
+    skipped = 0
+    while lines.peek() is not None:
+        table = start_table(lines, strip, bulk)
+        if table is None:
+            lines.skip()
+            skipped += 1
+            continue
+        yield table
+        for _ in table.rows:
+            pass
+    logging.debug("skipped %d lines outside tables", skipped)
@@ -16,45 +16,254 @@ EXAMPLES:
     # common usage:
     unixtime
 
+    # UTC, or local time with the offset in effect at each timestamp
+    unixtime.py --tz utc 1601172064
+    unixtime.py --tz localized --filter < app.log
+
+    # convert every epoch in a log, a block of lines at a time
+    unixtime.py --filter --batch < app.log
+
 """
 
 from datetime import datetime
 
 import argparse
+import bisect
+import functools
+import itertools
 import logging
+import math
 import re
 import sys
 import time
 
-import pytz
 import tzlocal
 
-
 TIMESTAMP_FORMAT = "%(asctime)s %(levelname)s - %(message)s"
 
 OFFSET = 1
 UTC = 2
 LOCALIZED = 3
 
+EPOCH_PATTERN = re.compile(r"\d{9,14}")
+# split() keeps the epochs, at the odd indexes
+EPOCH_SPLIT = re.compile(r"(\d{9,14})")
+
+# lines converted together in --batch mode
+BLOCK_SIZE = 10_000
+
+# formatted seconds kept by UnixTimeParser.format_datetime
+CACHE_SIZE = 4096
+
+DEFAULT_FORMAT = "%Y-%m-%d %H:%M:%S"
+DAY = 86400
+# ZoneOffsets samples the zone this often, and covers this much more than the
+# timestamps it has seen
+SAMPLE_STEP = DAY
+TABLE_PADDING = 31 * DAY
+# and grows by at most this much for one timestamp
+MAX_GROWTH = 2 * 366 * DAY
+
+CONVERTERS = {"offset": OFFSET, "utc": UTC, "localized": LOCALIZED}
+
+
+@functools.lru_cache(maxsize=None)
+def local_zone():
+    """the local zone, looked up once per process"""
+    return tzlocal.get_localzone()
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def format_day(day: int) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(day * DAY))
+
+
+def format_seconds(seconds: int, tz_format=DEFAULT_FORMAT) -> str:
+    """
+    Format epoch seconds that already have the UTC offset added. The default
+    format only formats the date once per day, and does the time by hand.
+    """
+    if tz_format != DEFAULT_FORMAT:
+        return time.strftime(tz_format, time.gmtime(seconds))
+    day, rest = divmod(seconds, DAY)
+    hours, rest = divmod(rest, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{format_day(day)} {hours:02}:{minutes:02}:{secs:02}"
+
+
+def iso_seconds(seconds):
+    """
+    Epoch seconds in a numpy array formatted as "%Y-%m-%d %H:%M:%S", the
+    default tz_format, all at once.
+    """
+    import numpy as np
+
+    text = np.datetime_as_string(seconds.astype("datetime64[s]"), unit="s")
+    return np.char.replace(text, "T", " ")
+
+
+class ZoneOffsets:
+    """
+    The UTC offset transitions of a zone over a range of epoch seconds, which
+    grows to cover the timestamps looked up. Each lookup is a bisect in the
+    table, rather than a timezone conversion. The zone is sampled every
+    SAMPLE_STEP seconds, and a change is narrowed down to the second.
+
+    A zone with a fixed offset, like UTC, needs no table. Timestamps more
+    than MAX_GROWTH outside the table, like ids that happen to look like
+    epochs, are looked up in the zone directly rather than grow it.
+    """
+
+    def __init__(self, zone):
+        self.zone = zone
+        self.lo = self.hi = None
+        self.starts: list[int] = []
+        self.offsets: list[int] = []
+        self.suffixes: list[str] = []
+        # utcoffset(None) is only known for zones without transitions
+        fixed = zone.utcoffset(None)
+        self.fixed = None if fixed is None else self._lookup_zone(0)
+
+    def _local(self, seconds: int) -> datetime:
+        return datetime.fromtimestamp(seconds, self.zone)
+
+    def _offset(self, seconds: int) -> int:
+        return int(self._local(seconds).utcoffset().total_seconds())
+
+    def _lookup_zone(self, seconds: int) -> tuple[int, str]:
+        local = self._local(seconds)
+        return int(local.utcoffset().total_seconds()), local.strftime(" %z")
+
+    def _scan(self, lo: int, hi: int) -> tuple[list[int], list[int], list[str]]:
+        """the starts, offsets and suffixes of the transitions from lo to hi"""
+        logging.debug("offset table for %s from %d to %d", self.zone, lo, hi)
+        offset, suffix = self._lookup_zone(lo)
+        starts, offsets, suffixes = [lo], [offset], [suffix]
+        start = lo
+        while start < hi:
+            end = min(start + SAMPLE_STEP, hi)
+            if self._offset(end) != offsets[-1]:
+                # the first second with the new offset is in (start, end]
+                before = start
+                while end - before > 1:
+                    middle = (before + end) // 2
+                    if self._offset(middle) == offsets[-1]:
+                        before = middle
+                    else:
+                        end = middle
+                offset, suffix = self._lookup_zone(end)
+                starts.append(end)
+                offsets.append(offset)
+                suffixes.append(suffix)
+            start = end
+        return starts, offsets, suffixes
+
+    def cover(self, lo: int, hi: int) -> None:
+        """grow the table to cover lo to hi, scanning only the part not covered yet"""
+        if self.lo is None:
+            self.lo, self.hi = lo - TABLE_PADDING, hi + TABLE_PADDING
+            self.starts, self.offsets, self.suffixes = self._scan(self.lo, self.hi)
+            return
+        if lo < self.lo:
+            new_lo = lo - TABLE_PADDING
+            starts, offsets, suffixes = self._scan(new_lo, self.lo)
+            # the scan's last start may be self.lo, already in the table
+            n = bisect.bisect_left(starts, self.lo)
+            self.starts[:0] = starts[:n]
+            self.offsets[:0] = offsets[:n]
+            self.suffixes[:0] = suffixes[:n]
+            self.lo = new_lo
+        if hi >= self.hi:
+            new_hi = hi + TABLE_PADDING
+            starts, offsets, suffixes = self._scan(self.hi, new_hi)
+            self.starts += starts
+            self.offsets += offsets
+            self.suffixes += suffixes
+            self.hi = new_hi
+
+    def _near(self, seconds: int) -> bool:
+        return self.lo - MAX_GROWTH <= seconds < self.hi + MAX_GROWTH
+
+    def lookup(self, seconds: int) -> tuple[int, str]:
+        """the offset and " %z" suffix at seconds"""
+        if self.fixed:
+            return self.fixed
+        if self.lo is not None and not self._near(seconds):
+            return self._lookup_zone(seconds)
+        self.cover(seconds, seconds)
+        n = bisect.bisect_right(self.starts, seconds) - 1
+        return self.offsets[n], self.suffixes[n]
+
+    def lookup_array(self, seconds):
+        import numpy as np
+
+        if self.fixed:
+            offset, suffix = self.fixed
+            return np.full(len(seconds), offset), np.full(len(seconds), suffix)
+        if self.lo is None:
+            middle = int(np.median(seconds))
+            self.cover(middle, middle)
+        near = (seconds >= self.lo - MAX_GROWTH) & (seconds < self.hi + MAX_GROWTH)
+        if near.any():
+            self.cover(int(seconds[near].min()), int(seconds[near].max()))
+        n = np.searchsorted(np.array(self.starts), seconds, side="right") - 1
+        np.clip(n, 0, None, out=n)
+        offsets = np.array(self.offsets)[n]
+        suffixes = np.array(self.suffixes)[n]
+        for i in np.flatnonzero(~near):
+            offsets[i], suffixes[i] = self._lookup_zone(int(seconds[i]))
+        return offsets, suffixes
+
+
+# The converters' convert_array() formats a numpy array of distinct epoch
+# seconds like convert_to_datetime() with the default tz_format.
+
 
 class LocalizeConverter:
+    """local time, with the offset at that time"""
+
+    def __init__(self, zone=None):
+        self.zone_offsets = ZoneOffsets(zone or local_zone())
+
     def convert_to_datetime(self, epoch, tz_format):
-        localzone = tzlocal.get_localzone()
-        timestamp = datetime.fromtimestamp(epoch, pytz.utc)
-        localtime = timestamp.replace(tzinfo=pytz.utc).astimezone(localzone)
-        return localtime.strftime(tz_format + " %z")
+        seconds = math.floor(epoch)
+        offset, suffix = self.zone_offsets.lookup(seconds)
+        return format_seconds(seconds + offset, tz_format) + suffix
+
+    def convert_array(self, seconds):
+        import numpy as np
+
+        offsets, suffixes = self.zone_offsets.lookup_array(seconds)
+        return np.char.add(iso_seconds(seconds + offsets), suffixes)
 
 
 class UtcConverter:
     def convert_to_datetime(self, epoch, tz_format):
-        timestamp = datetime.fromtimestamp(epoch, pytz.utc)
-        return timestamp.strftime(tz_format) + "Z"
+        return format_seconds(math.floor(epoch), tz_format) + "Z"
+
+    def convert_array(self, seconds):
+        import numpy as np
+
+        return np.char.add(iso_seconds(seconds), "Z")
 
 
 class OffsetConverter:
+    """local time, with the offset in effect now"""
+
+    def __init__(self, zone=None):
+        self.zone_offsets = ZoneOffsets(zone or local_zone())
+        self.suffix = time.strftime(" %z")
+
     def convert_to_datetime(self, epoch, tz_format):
-        timestamp = datetime.fromtimestamp(epoch)
-        return timestamp.strftime(tz_format) + time.strftime(" %z")
+        seconds = math.floor(epoch)
+        offset, _ = self.zone_offsets.lookup(seconds)
+        return format_seconds(seconds + offset, tz_format) + self.suffix
+
+    def convert_array(self, seconds):
+        import numpy as np
+
+        offsets, _ = self.zone_offsets.lookup_array(seconds)
+        return np.char.add(iso_seconds(seconds + offsets), self.suffix)
 
 
 class UnixTimeParser:
@@ -68,16 +277,26 @@ class UnixTimeParser:
 
     def __init__(self, tz_output=OFFSET):
         self.tz_output = tz_output
-        self.tz_format = "%Y-%m-%d %H:%M:%S"
+        self.tz_format = DEFAULT_FORMAT
         if tz_output == LOCALIZED:
             self.converter = LocalizeConverter()
         elif tz_output == UTC:
             self.converter = UtcConverter()
         else:
             self.converter = OffsetConverter()
+        # the pattern that parsed the last date, tried first
+        self.last_pattern = self.DATE_PATTERNS[0]
+        # log timestamps repeat a lot at one second resolution
+        self.format_seconds = functools.lru_cache(maxsize=CACHE_SIZE)(
+            self._format_seconds
+        )
+
+    def _format_seconds(self, seconds: int) -> str:
+        return self.converter.convert_to_datetime(seconds, self.tz_format)
 
     def format_datetime(self, epoch) -> str:
-        return self.converter.convert_to_datetime(float(epoch), self.tz_format)
+        # the formats have no fractions, so whole seconds format the same
+        return self.format_seconds(math.floor(float(epoch)))
 
     def parse_digits(self, chars) -> int | str:
         if len(chars) > 10:
@@ -93,39 +312,95 @@ class UnixTimeParser:
         return int(chars) / 1000
 
     def parse_date(self, chars) -> str:
-        for pattern in self.DATE_PATTERNS:
+        patterns = [self.last_pattern]
+        patterns += [p for p in self.DATE_PATTERNS if p != self.last_pattern]
+        for pattern in patterns:
             try:
-                logging.debug(f"trying '{chars}' against pattern: '{pattern}'")
                 ts = datetime.strptime(chars, pattern)
-                return str(int(ts.timestamp()))
             except ValueError:
-                pass
+                continue
+            self.last_pattern = pattern
+            return str(int(ts.timestamp()))
+        logging.debug("no pattern matched '%s'", chars)
         raise ValueError("unparsable date: " + chars)
 
+    def convert_match(self, match: re.Match) -> str:
+        return self.parse_digits(match.group())
+
     def filter_line(self, line: str) -> str:
-        epoch_pattern = re.compile(r"\d{9,14}")
-        match = epoch_pattern.search(line)
-        if match:
-            epoch = match.group()
-            converted = self.parse_digits(epoch)
-            return line.replace(epoch, str(converted))
+        converted, count = EPOCH_PATTERN.subn(self.convert_match, line)
+        if count:
+            return converted
         elif line.strip():
             stripped = line.strip()
             try:
                 epoch = self.parse_date(stripped)
                 return line.replace(stripped, str(epoch))
             except ValueError:
-                print(f"didn't parse '{stripped}'")
-                pass
+                # on stderr, so --batch output stays in line order
+                logging.warning("didn't parse '%s'", stripped)
         return line
 
+    def filter_block(self, lines: list[str]) -> list[str]:
+        """
+        filter_line() for a block of lines. The epochs of every line are
+        converted together as one numpy array, each distinct second once,
+        and spliced back in.
+        """
+        import numpy as np
+
+        split = [EPOCH_SPLIT.split(line) for line in lines]
+        tokens = [token for parts in split for token in parts[1::2]]
+        if tokens:
+            seconds = np.array(tokens, dtype=np.int64)
+            millis = np.fromiter(map(len, tokens), np.int64, len(tokens)) > 10
+            seconds[millis] //= 1000
+            distinct, inverse = np.unique(seconds, return_inverse=True)
+            converted = self.converter.convert_array(distinct)[inverse].tolist()
+
+        filtered = []
+        n = 0
+        for line, parts in zip(lines, split):
+            if len(parts) == 1:
+                # no epochs, maybe a date
+                filtered.append(self.filter_line(line))
+                continue
+            count = len(parts) // 2
+            parts[1::2] = converted[n : n + count]
+            n += count
+            filtered.append("".join(parts))
+        return filtered
+
 
 def parse_args():
     desc = "generate, parse and convert to/from unix-style timestamps"
     p = argparse.ArgumentParser(description=desc)
+    p.add_argument("-d", "--debug", action="store_true", help="turn on debugging")
     p.add_argument(
         "-f", "--filter", action="store_true", help="filter mode/passthrough mode"
     )
+    p.add_argument(
+        "-z",
+        "--tz",
+        choices=list(CONVERTERS),
+        default="offset",
+        help="offset: local time with the current UTC offset. utc: UTC. "
+        "localized: local time with the offset at that time. default=%(default)s",
+    )
+    p.add_argument(
+        "-u",
+        "--utc",
+        dest="tz",
+        action="store_const",
+        const="utc",
+        help="same as --tz utc",
+    )
+    p.add_argument(
+        "-b",
+        "--batch",
+        action="store_true",
+        help=f"convert the epochs of {BLOCK_SIZE} lines at a time with numpy",
+    )
     p.add_argument(
         "args", nargs="*", help="a string to parser. If empty, read from STDIN"
     )
@@ -139,7 +414,7 @@ def run(opts):
         print(int(time.time()))
         return
 
-    parser = UnixTimeParser()
+    parser = UnixTimeParser(CONVERTERS[opts.tz])
 
     if opts.args:
         lines = opts.args
@@ -147,11 +422,20 @@ def run(opts):
         logging.debug("reading from STDIN")
         lines = sys.stdin
 
+    if opts.batch:
+        lines = iter(lines)
+        while block := list(itertools.islice(lines, BLOCK_SIZE)):
+            # one write per block, with print()'s newline after each line
+            sys.stdout.write("\n".join(parser.filter_block(block)) + "\n")
+        return
+
     for line in lines:
         print(parser.filter_line(line))
 
 
 if __name__ == "__main__":
     opts = parse_args()
-    logging.basicConfig(level=logging.DEBUG, format=TIMESTAMP_FORMAT)
+    logging.basicConfig(
+        level=logging.DEBUG if opts.debug else logging.INFO, format=TIMESTAMP_FORMAT
+    )
     run(opts)
@@ -114,61 +114,73 @@ $ vimdiff /tmp/out2/*
 Note that this is really only practical for a small number of files,
 e.g. no more than can fit comfortably onscreen in your multi-file diff viewer.
 
+For many rows, write them into a single archive instead of one file each:
+
+$ untabulate.py --archive /tmp/rows.tar.gz sample2.txt
+$ tar -xzf /tmp/rows.tar.gz -O 02
+
 """
 
-from collections.abc import Iterable, Generator
+from collections import deque
+from collections.abc import Callable, Iterable, Generator
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
 import argparse
 import csv
 import fileinput
+import io
+import itertools
 import logging
 import sys
 import tabulate
+import tarfile
+import time
+import zipfile
+
+from tabletext import BLOCK_SIZE, read_tables
 
 Row = list[str]
 Rows = list[Row]
 
 
-def parse_table(input_lines: Iterable[str]) -> tuple[Row, Rows]:
-    lines = list(input_lines)
+def parse_tables(input_lines: Iterable[str], bulk=False) -> Generator[Iterable[Row]]:
+    """
+    Yield one row stream per table in the input: the header row, then each
+    data row as its line is read. See tabletext for the layouts recognized.
+    """
+    for table in read_tables(input_lines, bulk=bulk):
+        yield itertools.chain([table.header], table.rows)
 
-    # Determine column widths
-    col_widths = [len(x) for x in lines[0].split("+")[1:-1]]
 
-    # Extract column names
-    col_names = lines[1].split("|")[1:-1]
-    col_names = [x.strip() for x in col_names]
-    logging.debug("names: %s", col_names)
-    logging.debug("withs: %s", col_widths)
-
-    # Parse the data
-    data: Rows = [col_names]
-    for line in lines[3:]:
-        if line.startswith("+"):
-            continue
+def parse_rows(input_lines: Iterable[str], bulk=False) -> Generator[Row]:
+    """
+    Yield the header row, then each data row of the first table. Nothing is
+    buffered. With bulk, lines are split a block of BLOCK_SIZE at a time.
+    """
+    for rows in parse_tables(input_lines, bulk):
+        yield from rows
+        return
 
-        start = 1
-        row: Row = []
-        for width, _ in zip(col_widths, col_names):
-            row.append(line[start : start + width].strip())
-            start += width + 1
-        data.append(row)
 
-    return col_names, data
+def parse_table(input_lines: Iterable[str], bulk=False) -> tuple[Row, Rows]:
+    data = list(parse_rows(input_lines, bulk))
+    return data[0], data
 
 
-def write_csv(data: Rows) -> None:
-    writer = csv.writer(sys.stdout)
+def write_csv(data: Iterable[Row], outfile=sys.stdout) -> None:
+    writer = csv.writer(outfile)
     writer.writerows(data)
 
 
-def write_tsv(data: Rows) -> None:
-    writer = csv.writer(sys.stdout, delimiter="\t")
+def write_tsv(data: Iterable[Row], outfile=sys.stdout) -> None:
+    writer = csv.writer(outfile, delimiter="\t")
     writer.writerows(data)
 
 
-def write_pretty(data: Rows, print_format, header=True, outfile=sys.stdout) -> None:
+def write_pretty(
+    data: Iterable[Row], print_format, header=True, outfile=sys.stdout
+) -> None:
     print(
         tabulate.tabulate(
             data,
@@ -181,14 +193,16 @@ def write_pretty(data: Rows, print_format, header=True, outfile=sys.stdout) -> N
     )
 
 
-def add_row_numbers(rows: Rows, column_name="rownum") -> Generator[Row]:
-    yield [column_name, *rows[0]]
+def add_row_numbers(rows: Iterable[Row], column_name="rownum") -> Generator[Row]:
+    rows = iter(rows)
+    yield [column_name, *next(rows)]
 
-    for i, row in enumerate(rows[1:]):
+    for i, row in enumerate(rows):
         yield [str(i + 1), *row]
 
 
-def transpose(data: Rows) -> Rows:
+def transpose(data: Iterable[Row]) -> Rows:
+    # transposing needs every row, so this buffers the whole table
     # zip(*rows) unpacks rows into a list of rows,
     # then zips the columns from a set of rows together
     # e.g. [('name', 'age'), ('joe', '31'), ('jane', '30')]
@@ -196,41 +210,145 @@ def transpose(data: Rows) -> Rows:
     return [list(row) for row in zip(*add_row_numbers(data, "fieldname"))]
 
 
-def write_long(data: Rows, print_format, outfile=sys.stdout) -> None:
-    headers = data[0]
+def is_plain(fields: Row) -> bool:
+    # printable ascii has one column per character, so len() is its width.
+    # tabulate strips the fields, so padded ones go through it
+    return all(f.isascii() and f.isprintable() and f == f.strip() for f in fields)
 
-    for row in data[1:]:
-        transposed = list(transpose([headers, row]))
-        write_pretty(transposed[1:], print_format, header=False, outfile=outfile)
-        print(file=outfile)
 
+def long_formatter(headers: Row, print_format) -> Callable[[Row], str]:
+    """
+    Return a function that formats one row in the two column long layout.
+    The header column is measured once. The "simple" format is built directly
+    when every field is plain ascii, and anything else goes through tabulate.
+    """
+    fast_headers = print_format == "simple" and bool(headers) and is_plain(headers)
+    key_width = max(map(len, headers), default=0)
 
-def write_one_row_per_file(data: Rows, print_format, folder) -> None:
-    headers = data[0]
-    for i, row in enumerate(data[1:]):
-        outfile = Path(folder) / str(i + 1).zfill(2)
-        transposed = list(transpose([headers, row]))
-        with open(outfile, "w") as handle:
-            write_pretty(transposed[1:], print_format, header=False, outfile=handle)
-            logging.info("wrote %s", outfile)
+    def format_row(row: Row) -> str:
+        if fast_headers and len(row) == len(headers) and is_plain(row):
+            val_width = max(map(len, row), default=0)
+            rule = ("-" * key_width + "  " + "-" * val_width).rstrip()
+            lines = [f"{h:<{key_width}}  {v}".rstrip() for h, v in zip(headers, row)]
+            return "\n".join([rule, *lines, rule])
+
+        return tabulate.tabulate(
+            list(zip(headers, row)),
+            tablefmt=print_format,
+            numalign=None,
+            disable_numparse=True,
+        )
 
+    return format_row
 
-def run(opts) -> None:
-    logging.debug("starting")
-    _, data = parse_table(fileinput.input(opts.files))
+
+def write_long(data: Iterable[Row], print_format, outfile=sys.stdout) -> None:
+    data = iter(data)
+    format_row = long_formatter(next(data, []), print_format)
+
+    for row in data:
+        print(format_row(row), file=outfile)
+        print(file=outfile)
+
+
+def write_file(path: Path, text: str) -> None:
+    with open(path, "w") as handle:
+        handle.write(text)
+    logging.info("wrote %s", path)
+
+
+def write_one_row_per_file(
+    data: Iterable[Row], print_format, folder, threads=8
+) -> None:
+    """
+    Rows are formatted here and the file writes are spread over a thread
+    pool. At most a few writes per thread are pending at once, so the
+    formatted rows don't pile up in memory.
+    """
+    data = iter(data)
+    format_row = long_formatter(next(data, []), print_format)
+    pending: deque[Future] = deque()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for i, row in enumerate(data):
+            outfile = Path(folder) / str(i + 1).zfill(2)
+            pending.append(pool.submit(write_file, outfile, format_row(row) + "\n"))
+            if len(pending) > threads * 4:
+                pending.popleft().result()
+        for future in pending:
+            future.result()
+
+
+def write_archive(data: Iterable[Row], print_format, archive: str) -> None:
+    """
+    Like write_one_row_per_file, but each row is a member of a single tar or
+    zip archive rather than a file of its own.
+    """
+    data = iter(data)
+    format_row = long_formatter(next(data, []), print_format)
+
+    if archive.endswith(".zip"):
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            for i, row in enumerate(data):
+                zf.writestr(str(i + 1).zfill(2), format_row(row) + "\n")
+        logging.info("wrote %s", archive)
+        return
+
+    compression = {".gz": "gz", ".tgz": "gz", ".bz2": "bz2", ".xz": "xz"}
+    mode = "w:" + compression.get(Path(archive).suffix, "")
+    now = int(time.time())
+    with tarfile.open(archive, mode) as tf:
+        for i, row in enumerate(data):
+            content = (format_row(row) + "\n").encode()
+            info = tarfile.TarInfo(str(i + 1).zfill(2))
+            info.size = len(content)
+            info.mtime = now
+            tf.addfile(info, io.BytesIO(content))
+    logging.info("wrote %s", archive)
+
+
+def write_table(opts, data: Iterable[Row], outfile=sys.stdout) -> None:
     if opts.transpose:
         data = transpose(data)
 
     if opts.pretty:
-        write_pretty(data, opts.format)
+        write_pretty(data, opts.format, outfile=outfile)
     elif opts.long:
-        write_long(data, opts.format)
-    elif opts.row_per_file:
-        write_one_row_per_file(data, opts.format, opts.row_per_file)
+        write_long(data, opts.format, outfile=outfile)
     elif opts.tsv:
-        write_tsv(data)
+        write_tsv(data, outfile)
     else:
-        write_csv(data)
+        write_csv(data, outfile)
+
+
+def run(opts) -> None:
+    logging.debug("starting")
+    # rows stream straight through to the writers. Only transpose and the
+    # pretty printer need the whole table.
+    tables = parse_tables(fileinput.input(opts.files), opts.bulk)
+
+    if opts.row_per_file or opts.archive:
+        data = next(tables, [])
+        if opts.row_per_file:
+            write_one_row_per_file(data, opts.format, opts.row_per_file, opts.threads)
+        else:
+            write_archive(data, opts.format, opts.archive)
+        if next(tables, None) is not None:
+            logging.warning("only the first table is written one row per file")
+        return
+
+    suffix = ".tsv" if opts.tsv else ".csv"
+    if opts.pretty or opts.long:
+        suffix = ".txt"
+    for n, data in enumerate(tables):
+        if opts.split:
+            outfile = Path(opts.split) / f"{n + 1:02}{suffix}"
+            with open(outfile, "w", newline="") as handle:
+                write_table(opts, data, handle)
+            logging.info("wrote %s", outfile)
+            continue
+        if n:
+            print()
+        write_table(opts, data)
 
 
 def existing_directory(path) -> Path:
@@ -262,6 +380,32 @@ def parse_args() -> argparse.Namespace:
         metavar="FOLDER",
         help="write each row to a numbered output file in FOLDER (for diffing)",
     )
+    parser.add_argument(
+        "-s",
+        "--split",
+        type=existing_directory,
+        metavar="FOLDER",
+        help="write each table in the input to a numbered file in FOLDER",
+    )
+    parser.add_argument(
+        "-a",
+        "--archive",
+        metavar="FILE",
+        help="like --row-per-file, but write the rows into one .tar, .tar.gz, "
+        ".tgz, .tar.bz2, .tar.xz or .zip archive",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=8,
+        help="threads writing --row-per-file output. Default is %(default)s",
+    )
+    parser.add_argument(
+        "-B",
+        "--bulk",
+        action="store_true",
+        help=f"split input {BLOCK_SIZE} lines at a time. Faster for large tables",
+    )
     parser.add_argument(
         "-f",
         "--format",
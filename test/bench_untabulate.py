@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Benchmark untabulate.parse_rows on a generated psql/spark style dump.
+
+Not collected by pytest. Run it directly:
+
+    $ cd test && python bench_untabulate.py --rows 1000000
+"""
+
+import argparse
+import sys
+import time
+
+sys.path.append("../bin")
+import untabulate
+
+WIDTHS = [12, 8, 24, 6, 15, 10]
+
+
+def make_dump(rows: int) -> list[str]:
+    border = "+" + "+".join("-" * w for w in WIDTHS) + "+\n"
+    header = "|" + "|".join(f"col{i}".center(w) for i, w in enumerate(WIDTHS)) + "|\n"
+    lines = [border, header, border]
+    for n in range(rows):
+        fields = [str(n * (i + 1))[:w].rjust(w) for i, w in enumerate(WIDTHS)]
+        lines.append("|" + "|".join(fields) + "|\n")
+    lines.append(border)
+    return lines
+
+
+def bench(lines: list[str], bulk: bool) -> tuple[int, float]:
+    start = time.perf_counter()
+    count = 0
+    for _ in untabulate.parse_rows(lines, bulk=bulk):
+        count += 1
+    return count - 1, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    opts = parser.parse_args()
+
+    lines = make_dump(opts.rows)
+    assert list(untabulate.parse_rows(lines[:1000])) == list(
+        untabulate.parse_rows(lines[:1000], bulk=True)
+    )
+
+    for bulk in [False, True]:
+        rows, elapsed = bench(lines, bulk)
+        label = "bulk" if bulk else "per-line"
+        print(f"{label:10} {rows} rows in {elapsed:.2f}s: {rows / elapsed:,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env pytest
+
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append("../bin")
+import dateplot
+
+
+def test_lttb_keeps_the_ends_and_threshold_points():
+    rng = np.random.default_rng(1)
+    for n, threshold in ((1000, 100), (10, 9), (10, 3), (7, 4), (5000, 1234)):
+        x = np.arange(n, dtype=float)
+        y = rng.normal(size=n)
+
+        keep = dateplot.lttb(x, y, threshold)
+
+        assert len(keep) == threshold
+        assert keep[0] == 0 and keep[-1] == n - 1
+        assert (np.diff(keep) > 0).all()
+
+
+def test_lttb_keeps_the_spike():
+    y = np.zeros(1000)
+    y[517] = 100
+
+    keep = dateplot.lttb(np.arange(1000.0), y, 20)
+
+    assert 517 in keep
+
+
+def test_lttb_keeps_everything_under_the_threshold():
+    keep = dateplot.lttb(np.arange(5.0), np.arange(5.0), 10)
+
+    assert keep.tolist() == [0, 1, 2, 3, 4]
+
+
+def test_downsample_sorts_by_date_and_keeps_max_points():
+    dates = pd.date_range("2024-08-01", periods=500, freq="min")
+    df = pd.DataFrame({"datetime": dates[::-1], "val": np.arange(500.0)})
+
+    result = dateplot.downsample(df, 50)
+
+    assert len(result) == 50
+    assert result["datetime"].is_monotonic_increasing
+    assert result["datetime"].iloc[0] == dates[0]
+
+
+def test_aggregate_count_and_p99_per_period():
+    hours = pd.date_range("2024-08-01", periods=48, freq="h")
+    # day one has 24 values 0-23, day two 24 values of 100-123
+    df = pd.DataFrame({"datetime": hours, "val": np.r_[np.arange(24.0), np.arange(24.0) + 100]})
+
+    counts = dateplot.aggregate(df, dateplot.parse_args(["--resample", "D", "--agg", "count", "-"]))
+    p99 = dateplot.aggregate(df, dateplot.parse_args(["--day", "--agg", "p99", "-"]))
+
+    assert counts["val"].tolist() == [24, 24]
+    assert counts["datetime"].tolist() == [pd.Timestamp("2024-08-01"), pd.Timestamp("2024-08-02")]
+    assert p99["val"].tolist() == pytest.approx(
+        [np.percentile(np.arange(24.0), 99), np.percentile(np.arange(24.0) + 100, 99)]
+    )
+
+
+def keyed_frame():
+    return pd.DataFrame(
+        {
+            "datetime": pd.to_datetime(["2024-08-01", "2024-08-01", "2024-08-02", "2024-08-02", "2024-08-03"]),
+            "val": [3.0, 5.0, 1.0, 9.0, 1.0],
+            "key": ["a", "b", "a", "c", "b"],
+        }
+    )
+
+
+def test_top_keys_keeps_the_largest_totals_in_order():
+    opts = dateplot.parse_args(["--key", "--top", "2", "-"])
+
+    df = dateplot.top_keys(keyed_frame(), opts)
+
+    # c: 9, b: 6, a: 4
+    assert [key for key, _ in dateplot.series(df)] == ["c", "b"]
+    assert dateplot.series(df)[1][1]["val"].tolist() == [5.0, 1.0]
+
+
+def test_top_keys_keeps_every_key_in_batch_mode():
+    opts = dateplot.parse_args(["--key", "--batch", "charts", "-"])
+
+    df = dateplot.top_keys(keyed_frame(), opts)
+
+    assert [key for key, _ in dateplot.series(df)] == ["c", "b", "a"]
+
+
+def test_batch_with_key_writes_a_chart_per_top_key(tmp_path):
+    data = tmp_path / "keyed.txt"
+    data.write_text("".join(f"{d.date()} {v} {k}\n" for d, v, k in keyed_frame().itertuples(index=False)))
+    charts = tmp_path / "charts"
+    opts = dateplot.parse_args(["--key", "--top", "2", "--batch", str(charts), "-n", str(data)])
+
+    dateplot.run_batch(opts)
+
+    assert sorted(path.name for path in charts.iterdir()) == ["b.png", "c.png"]
+
+
+def test_batch_needs_input_files(capsys):
+    with pytest.raises(SystemExit):
+        dateplot.parse_args(["--batch", "charts"])
+    assert "--batch needs input files" in capsys.readouterr().err
+
+
+def test_key_and_by_file_are_exclusive(capsys):
+    with pytest.raises(SystemExit):
+        dateplot.parse_args(["--key", "--by-file", "a.txt"])
+    assert "not allowed with argument" in capsys.readouterr().err
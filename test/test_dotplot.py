@@ -0,0 +1,88 @@
+#!/usr/bin/env pytest
+
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append("../bin")
+import dotplot
+
+
+def test_grid_grows_and_keeps_every_point():
+    grid = dotplot.DensityGrid(8, 4)
+
+    grid.add(np.array([1.0, 2.0, 3.0]))
+    grid.add(np.arange(20.0) * 10 - 50)
+
+    assert grid.n == 23
+    assert grid.counts.sum() == 23
+    assert grid.span == 4
+    assert grid.lo <= -50 and grid.hi > 140
+    x0, x1, y0, y1 = grid.extent()
+    assert (x0, x1) == (0, 24)
+    assert y0 <= -50 and y1 > 140
+
+
+def test_read_values_skips_bad_lines():
+    lines = ["1\n", "2.5\n", "oops\n", "nan\n", "-3e2\n"]
+
+    chunks = list(dotplot.read_values(lines, size=2))
+
+    values = np.concatenate(chunks)
+    assert values[:2].tolist() == [1.0, 2.5]
+    assert values[-1] == -300.0
+    assert len(values) == 4
+
+
+def test_odd_grid_keeps_every_point():
+    grid = dotplot.DensityGrid(5, 3)
+
+    grid.add(np.array([0.0, 1.0, 2.0]))
+    grid.add(np.array([100.0]))
+    grid.add(np.array([-100.0]))
+    grid.add(np.arange(20.0))
+
+    assert grid.n == 25
+    assert grid.counts.sum() == 25
+    assert grid.span == 8
+    x0, x1, y0, y1 = grid.extent()
+    assert (x0, x1) == (0, 32)
+    assert y0 <= -100 and y1 > 100
+    # each point is in the row holding its value
+    row = (grid.hi - grid.lo) / grid.height
+    assert grid.counts[int((100 - grid.lo) / row)].sum() == 1
+    assert grid.counts[int((-100 - grid.lo) / row)].sum() == 1
+
+
+def test_constant_large_values_get_a_range():
+    # epoch nanoseconds, where lo + 1 rounds back to lo
+    grid = dotplot.DensityGrid(8, 4)
+
+    grid.add(np.full(5, 1.7e18))
+    grid.add(np.array([1.7e18 + 2**20]))
+
+    assert grid.lo < grid.hi
+    assert grid.counts.sum() == 6
+
+
+def test_batch_writes_a_chart_per_file(tmp_path):
+    inputs = []
+    for name in ("up", "down", "up"):
+        folder = tmp_path / f"in{len(inputs)}"
+        folder.mkdir()
+        path = folder / f"{name}.txt"
+        path.write_text("".join(f"{n}\n" for n in range(100)))
+        inputs.append(str(path))
+    opts = dotplot.parse_args(["--batch", str(tmp_path / "charts"), *inputs])
+
+    dotplot.run(opts)
+
+    charts = sorted(path.name for path in (tmp_path / "charts").iterdir())
+    assert charts == ["down.png", "up-3.png", "up.png"]
+
+
+def test_batch_needs_input_files(capsys):
+    with pytest.raises(SystemExit):
+        dotplot.parse_args(["--batch", "charts"])
+    assert "--batch needs input files" in capsys.readouterr().err
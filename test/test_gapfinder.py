@@ -0,0 +1,117 @@
+#!/usr/bin/env pytest
+
+import io
+import sys
+
+sys.path.append("../bin")
+import gapfinder
+
+
+def find_gaps(lines, gap_threshold=5, context=1):
+    output = io.StringIO()
+    gapfinder.identify_gaps(io.StringIO("".join(lines)), output, gap_threshold, context)
+    return output.getvalue()
+
+
+def test_line_seconds():
+    assert gapfinder.line_seconds("24/01/02 03:04:05 hello") - gapfinder.line_seconds(
+        "24/01/01 23:59:59 hello"
+    ) == 3 * 3600 + 4 * 60 + 6
+    assert gapfinder.line_seconds("24/01/02 03:04:05") is None
+    assert gapfinder.line_seconds("24-01-02 03:04:05 hello") is None
+    assert gapfinder.line_seconds("  continued") is None
+
+
+def test_gap_with_context():
+    lines = [
+        "24/01/01 00:00:00 a\n",
+        "24/01/01 00:00:01 b\n",
+        "  more b\n",
+        "24/01/01 00:00:30 c\n",
+        "24/01/01 00:00:31 d\n",
+        "24/01/01 00:00:32 e\n",
+    ]
+
+    assert find_gaps(lines) == (
+        "\nGap detected: 29.0 seconds between the following lines:\n"
+        "24/01/01 00:00:00 a\n"
+        "24/01/01 00:00:01 b\n"
+        "===== GAP =====\n"
+        "24/01/01 00:00:30 c\n"
+        "24/01/01 00:00:31 d\n"
+    )
+
+
+def test_gap_in_trailing_context_waits():
+    lines = [
+        "24/01/01 00:00:00 a\n",
+        "24/01/01 00:00:10 b\n",
+        "24/01/01 00:00:20 c\n",
+        "24/01/01 00:00:21 d\n",
+    ]
+
+    output = find_gaps(lines, context=2)
+
+    assert output == (
+        "\nGap detected: 10.0 seconds between the following lines:\n"
+        "24/01/01 00:00:00 a\n"
+        "===== GAP =====\n"
+        "24/01/01 00:00:10 b\n"
+        "24/01/01 00:00:20 c\n"
+        "24/01/01 00:00:21 d\n"
+        "\nGap detected: 10.0 seconds between the following lines:\n"
+        "24/01/01 00:00:00 a\n"
+        "24/01/01 00:00:10 b\n"
+        "===== GAP =====\n"
+        "24/01/01 00:00:20 c\n"
+        "24/01/01 00:00:21 d\n"
+    )
+
+
+def test_sniff_extractor():
+    iso = ["2024-08-01T07:08:30.5+02:00 a\n", "2024-08-01 05:08:31Z b\n"]
+    epoch = ["1722496110 a\n", "1722496110500 b\n"]
+    syslog = ["Aug  1 07:08:30 host a\n", "  more\n"]
+
+    for lines, name in ((iso, "iso"), (epoch, "epoch"), (syslog, "syslog")):
+        extractor = gapfinder.sniff_extractor(lines)
+        assert extractor.name == name
+    seconds = gapfinder.IsoTimestamps().seconds
+    assert seconds(iso[1]) - seconds(iso[0]) == 0.5
+    seconds = gapfinder.EpochTimestamps().seconds
+    assert seconds(epoch[1]) - seconds(epoch[0]) == 0.5
+    assert seconds("12345 not an epoch") is None
+
+
+def test_summarize_gaps():
+    lines = [f"1722496{n:03} line {n}\n" for n in (0, 1, 2, 3, 13, 14, 15, 45, 46)]
+    output = io.StringIO()
+
+    gapfinder.summarize_gaps(lines, output, 5, 2, gapfinder.EpochTimestamps())
+
+    summary = output.getvalue()
+    assert summary.startswith("8 gaps between timestamped lines\n  p50: 1 seconds\n")
+    assert "  max: 30.0 seconds\n  over 5 seconds: 2\n" in summary
+    assert summary.index("30.0 seconds before line 8") < summary.index("10.0 seconds before line 5")
+
+
+def test_merged_gaps(tmp_path):
+    a = tmp_path / "a.log"
+    b = tmp_path / "b.log"
+    a.write_text("1722496000 a1\n  trace\n1722496010 a2\n1722496100 a3\n")
+    b.write_text("2024-08-01T07:06:45Z b1\n2024-08-01T07:07:30Z b2\n2024-08-01T07:08:25Z b3\n")
+    opts = gapfinder.parse_args(["-g", "30", "-c", "0", "--merged", str(a), str(b)])
+    output = io.StringIO()
+
+    gapfinder.scan_merged(opts.logfiles, output, opts)
+
+    assert output.getvalue() == (
+        "\nGap detected: 40.0 seconds between the following lines:\n"
+        f"{a}:3: 1722496010 a2\n"
+        "===== GAP =====\n"
+        f"{b}:2: 2024-08-01T07:07:30Z b2\n"
+        "\nGap detected: 50.0 seconds between the following lines:\n"
+        f"{b}:2: 2024-08-01T07:07:30Z b2\n"
+        "===== GAP =====\n"
+        f"{a}:4: 1722496100 a3\n"
+    )
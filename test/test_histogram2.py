@@ -0,0 +1,67 @@
+#!/usr/bin/env pytest
+
+import functools
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append("../bin")
+import histogram2
+import plotting
+
+
+def pipe(lines):
+    """a non-seekable handle, like STDIN, reading lines"""
+    read_fd, write_fd = os.pipe()
+    with os.fdopen(write_fd, "w") as writer:
+        writer.writelines(lines)
+    return os.fdopen(read_fd)
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(histogram2, "read_values", functools.partial(plotting.read_values, size=7))
+
+
+def test_counts_match_numpy_on_a_pipe(small_chunks):
+    values = np.random.default_rng(3).normal(size=500).round(3)
+    lines = [f"{v}\n" for v in values] + ["oops\n", "nan\n", "inf\n"]
+
+    with pipe(lines) as handle:
+        assert not handle.seekable()
+        edges, counts = histogram2.histogram(handle, 13)
+
+    expected, expected_edges = np.histogram(values, 13)
+    assert counts.tolist() == expected.tolist()
+    assert edges == pytest.approx(expected_edges)
+
+
+def test_value_range(small_chunks, tmp_path):
+    data = tmp_path / "values.txt"
+    data.write_text("3\n-inf\n7\n2.5\n" * 5)
+
+    with open(data) as handle:
+        assert histogram2.value_range(handle) == (2.5, 7.0)
+    assert histogram2.value_range(iter(["4\n", "4\n"])) == (3.5, 4.5)
+    assert histogram2.value_range(iter(["x\n"])) == (0.0, 1.0)
+
+
+def test_fixed_range_counts_the_right_edge_and_warns_about_the_rest(small_chunks, caplog):
+    lines = [f"{v}\n" for v in [0, 0.5, 1, 2, 2, 2.5, 3, -1, 4, 3.000001]]
+
+    edges, counts = histogram2.histogram(iter(lines), 3, (0, 3))
+
+    assert edges.tolist() == [0, 1, 2, 3]
+    # the last bin includes 3, like np.histogram
+    assert counts.tolist() == [2, 1, 4]
+    assert "3 values outside the range 0.0 to 3.0" in caplog.text
+
+
+def test_bins_and_range_are_checked(capsys):
+    for args in (["--bins", "0"], ["--bins", "-2"], ["--bins", "x"], ["--range", "2", "1"]):
+        with pytest.raises(SystemExit):
+            histogram2.parse_args([*args, "-"])
+    assert "is not a number of bins" in capsys.readouterr().err
+    assert histogram2.parse_args(["--bins", "1", "-"]).bins == 1
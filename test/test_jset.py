@@ -0,0 +1,148 @@
+#!/usr/bin/env pytest
+
+import sys
+
+import pytest
+
+sys.path.append("../bin")
+import jset
+
+
+def write_inputs(tmp_path, a_lines, b_lines):
+    a = tmp_path / "a"
+    b = tmp_path / "b"
+    a.write_text("".join(f"{line}\n" for line in a_lines))
+    b.write_text("".join(f"{line}\n" for line in b_lines))
+    return str(a), str(b)
+
+
+def run_jset(capsys, args):
+    jset.run(jset.parse_args(args))
+    return capsys.readouterr().out
+
+
+def test_default_sections(tmp_path, capsys):
+    a, b = write_inputs(tmp_path, ["3", "1", "2"], ["2", "4"])
+
+    result = run_jset(capsys, [a, b])
+
+    expected = (
+        f"---------- only_a {a} ----------\n1\n3\n"
+        f"---------- only_b {b} ----------\n4\n"
+        "---------- both  ----------\n2\n"
+    )
+    assert result == expected
+
+
+def test_json_matches_json_dumps(tmp_path, capsys):
+    import json
+
+    a, b = write_inputs(tmp_path, ["1", "2"], ["2"])
+
+    result = run_jset(capsys, ["-j", a, b])
+
+    expected = {"only_a": ["1"], "only_b": [], "both": ["2"]}
+    assert result == json.dumps(expected, indent=2) + "\n"
+
+
+def test_external_matches_in_memory(tmp_path, capsys):
+    a_lines = [str(i) for i in range(0, 300, 2)] + ["cr\r"]
+    b_lines = [str(i) for i in range(0, 300, 3)]
+    a, b = write_inputs(tmp_path, a_lines, b_lines)
+
+    for flag in ["-1", "-2", "-3", "-u", "-j"]:
+        in_memory = run_jset(capsys, [flag, a, b])
+        external = run_jset(
+            capsys, ["-X", "--partitions", "5", "--tmpdir", str(tmp_path), flag, a, b]
+        )
+        assert external == in_memory
+
+
+def test_unsorted_keeps_input_order(tmp_path, capsys):
+    a, b = write_inputs(tmp_path, ["9", "1", "5", "1"], ["5", "7", "3", "7", "9"])
+
+    assert run_jset(capsys, ["-1", "--unsorted", a, b]) == "1\n"
+    assert run_jset(capsys, ["-2", "--unsorted", a, b]) == "7\n3\n"
+    assert run_jset(capsys, ["-3", "--unsorted", a, b]) == "5\n9\n"
+
+
+def test_table_merges_sorted_sections(tmp_path, capsys):
+    a, b = write_inputs(tmp_path, ["1", "2", "4"], ["2", "3"])
+
+    lines = jset.make_matrix(jset.compute_sets(jset.parse_args([a, b])))
+
+    assert lines == [["1", "", ""], ["", "", "2"], ["", "3", ""], ["4", "", ""]]
+
+
+def write_nway_inputs(tmp_path):
+    contents = [["1", "2", "3"], ["2", "3", "4"], ["3", "4", "5", "1"]]
+    paths = []
+    for i, lines in enumerate(contents):
+        path = tmp_path / f"m{i + 1}"
+        path.write_text("".join(f"{line}\n" for line in lines))
+        paths.append(str(path))
+    return paths
+
+
+def test_nway_exactly_and_at_least(tmp_path, capsys):
+    paths = write_nway_inputs(tmp_path)
+
+    assert run_jset(capsys, ["--exactly", "1,3"] + paths) == "1\n"
+    assert run_jset(capsys, ["--exactly", "3"] + paths) == "5\n"
+    assert run_jset(capsys, ["--at-least", "2"] + paths) == "1\n2\n3\n4\n"
+
+
+def test_nway_masks_in_one_pass(tmp_path):
+    paths = write_nway_inputs(tmp_path)
+    opts = jset.parse_args(paths)
+
+    masks = jset.compute_masks(opts.inputs)
+
+    assert masks == {"1": 0b101, "2": 0b011, "3": 0b111, "4": 0b110, "5": 0b100}
+    assert jset.mask_pattern(masks["1"], 3) == "X.X"
+
+
+def test_estimate_is_close(tmp_path):
+    a, b = write_inputs(tmp_path, range(0, 20000), range(10000, 25000))
+    opts = jset.parse_args(["--estimate", a, b])
+
+    report = jset.estimate_overlap(*[jset.read_sketch(opts, fh) for fh in opts.inputs])
+
+    for name, expected in [("a", 20000), ("b", 15000), ("both", 10000)]:
+        estimate, stderr = report[name]
+        assert abs(estimate - expected) < 4 * stderr
+    j, j_err = report["jaccard"]
+    assert abs(j - 0.4) < 4 * j_err
+
+
+def test_saved_sketches_merge_like_raw_input(tmp_path):
+    a, b = write_inputs(tmp_path, range(0, 3000), range(2000, 5000))
+    both = tmp_path / "both"
+    both.write_text("".join(f"{i}\n" for i in range(0, 5000)))
+    jset.run(jset.parse_args(["-E", "--save-sketches", str(tmp_path / "sk"), a, b]))
+    merged = str(tmp_path / "merged.sketch")
+
+    saved = [str(tmp_path / "sk" / name) for name in ["a.sketch", "b.sketch"]]
+    jset.run(jset.parse_args(["--merge-sketches", merged] + saved))
+
+    opts = jset.parse_args(["-E", merged, str(both)])
+    from_sketches, from_lines = [jset.read_sketch(opts, fh) for fh in opts.inputs]
+    assert from_sketches.registers == from_lines.registers
+    assert from_sketches.mins == from_lines.mins
+
+
+def test_partitions_below_one_are_rejected(tmp_path, capsys):
+    a, b = write_inputs(tmp_path, ["1"], ["1"])
+
+    with pytest.raises(SystemExit):
+        jset.parse_args(["-X", "--partitions", "0", a, b])
+    assert "--partitions must be at least 1" in capsys.readouterr().err
+
+
+def test_sketches_of_different_precision_are_rejected(tmp_path):
+    a, b = write_inputs(tmp_path, range(100), range(50, 150))
+    jset.run(jset.parse_args(["--precision", "14", "--merge-sketches", str(tmp_path / "a14.sketch"), a, a]))
+
+    with pytest.raises(SystemExit) as e:
+        jset.run(jset.parse_args(["-E", "--precision", "12", str(tmp_path / "a14.sketch"), b]))
+    assert str(e.value) == f"jset.py: error: sketches need the same --precision, not {tmp_path}/a14.sketch: 14, {b}: 12"
@@ -0,0 +1,188 @@
+#!/usr/bin/env pytest
+
+import sys
+from subprocess import check_output
+
+import pandas as pd
+
+from utils import get_cmd, run_and_check
+
+sys.path.append("../bin")
+import quantize_times
+
+QUANTIZE_TIMES = get_cmd("quantize_times.py")
+
+
+def quantize(args, lines, tmp_path, monkeypatch, capsys, chunk_size=None):
+    """quantize_times.run() on lines, returning its output lines"""
+    path = tmp_path / "times.txt"
+    path.write_text("".join(line + "\n" for line in lines))
+    monkeypatch.setattr(sys, "argv", ["quantize_times.py", *args, str(path)])
+    if chunk_size:
+        monkeypatch.setattr(quantize_times, "CHUNK_SIZE", chunk_size)
+    quantize_times.run(quantize_times.parse_args())
+    return capsys.readouterr().out.splitlines()
+
+
+def test_001_us_format_default_buckets():
+    results = run_and_check([QUANTIZE_TIMES], "quantize_times_001")
+    assert results["actual"] == results["expected"]
+
+
+def test_sniff_format_skips_values_it_cannot_guess():
+    values = pd.Series(["08/01/2024 12:25:08 AM", "08/01/2024 07:08:30 AM", "08/13/2024 03:08:57 PM"])
+
+    assert quantize_times.sniff_format(values) == "%m/%d/%Y %I:%M:%S %p"
+    assert quantize_times.sniff_format(pd.Series(["tomorrow", "2024-08-01"])) == "mixed"
+
+
+def test_chunk_in_another_format_is_parsed_as_mixed(tmp_path, monkeypatch, capsys):
+    lines = [
+        "08/01/2024 07:08:30 AM",
+        "08/01/2024 12:25:08 PM",
+        # not the format guessed from the first chunk
+        "2024-08-01 10:11:12",
+        "Aug 2 2024 01:00:00",
+    ]
+
+    result = quantize(["-b", "1h"], lines, tmp_path, monkeypatch, capsys, chunk_size=2)
+
+    assert result == [
+        "2024-08-01 07:00:00",
+        "2024-08-01 12:00:00",
+        "2024-08-01 10:00:00",
+        "2024-08-02 01:00:00",
+    ]
+
+
+def test_unix_timestamps_in_seconds_and_millis(tmp_path, monkeypatch, capsys):
+    lines = ["1722633512", "1722633520000", "1722633529999"]
+
+    result = quantize(["-u", "-b", "10s"], lines, tmp_path, monkeypatch, capsys, chunk_size=2)
+
+    assert result == ["2024-08-02 21:18:30", "2024-08-02 21:18:40", "2024-08-02 21:18:40"]
+
+
+def test_002_agg_max_with_time_fields():
+    results = run_and_check([QUANTIZE_TIMES, "--time-fields", "3", "--agg", "max:4"], "quantize_times_002")
+    assert results["actual"] == results["expected"]
+
+
+def test_buckets_add_and_add_value_keep_the_same_totals():
+    hour = pd.Timestamp("2024-08-01 10:00:00")
+    buckets = [hour, hour, hour + pd.Timedelta("1h")]
+    values = [1.0, float("nan"), 4.0]
+    by_chunk = quantize_times.Buckets()
+    by_line = quantize_times.Buckets()
+
+    by_chunk.add(pd.Series(buckets[:2]), pd.Series(values[:2]))
+    by_chunk.add(pd.Series(buckets[2:]), pd.Series(values[2:]))
+    for bucket, value in zip(buckets, values):
+        by_line.add_value(bucket, value)
+
+    assert by_chunk.totals == by_line.totals == {hour: [2, 1, 1.0, 1.0], buckets[2]: [1, 1, 4.0, 4.0]}
+
+
+def test_buckets_pop_before_closes_earlier_buckets(caplog):
+    buckets = quantize_times.Buckets()
+    for bucket in (10, 20, 20, 30):
+        buckets.add_value(bucket)
+
+    assert [b for b, _ in buckets.pop_before(30)] == [10, 20]
+    assert list(buckets.totals) == [30]
+    assert not caplog.records
+    buckets.add_value(20)
+    assert "not in time order" in caplog.text
+
+
+def test_sorted_count_and_mean_match_unsorted(tmp_path, monkeypatch, capsys):
+    lines = [
+        "2024-08-01T10:11:12 3",
+        "2024-08-01T10:40:00 5",
+        "2024-08-01T11:00:00 1",
+        "2024-08-01T11:59:59 oops",
+        "2024-08-01T13:00:00 2",
+    ]
+
+    # --count takes the whole line as the time
+    times = [line.split()[0] for line in lines]
+
+    for args, lines, expected in (
+        (["--count"], times, ["2024-08-01 10:00:00\t2", "2024-08-01 11:00:00\t2", "2024-08-01 13:00:00\t1"]),
+        (["--agg", "mean:2"], lines, ["2024-08-01 10:00:00\t4", "2024-08-01 11:00:00\t1", "2024-08-01 13:00:00\t2"]),
+    ):
+        unsorted = quantize(["-b", "1h", *args], lines, tmp_path, monkeypatch, capsys, chunk_size=2)
+        in_order = quantize(["-b", "1h", "--sorted", *args], lines, tmp_path, monkeypatch, capsys, chunk_size=2)
+        assert unsorted == in_order == expected
+
+
+def test_stdlib_and_pandas_engines_agree(tmp_path, monkeypatch, capsys):
+    iso = ["2024-01-01T00:00:00", "2024-01-01 00:07:59.500", "", "2024-01-01 13:59:59", "2024-01-02T00:00:00.001"]
+    offsets = ["2024-01-01T23:10:00+05:30", "2024-01-02T01:00:00+05:30", "2024-01-02T09:59:59+05:30"]
+    epochs = ["1722633512", "1722633520000", "1722637199", "1722637200"]
+    values = ["2024-08-01T10:11:12 3", "2024-08-01T10:40:00 5", "2024-08-01T11:00:00 1", "2024-08-01T13:00:00 x"]
+
+    for args, lines in (
+        (["-b", "15min"], iso),
+        (["-b", "1D", "--count"], iso),
+        (["-b", "7h"], offsets),
+        (["-u", "-b", "10s"], epochs),
+        (["-u", "-b", "1h", "--count", "--sorted"], epochs),
+        (["-b", "1h", "--agg", "mean:2", "--sorted"], values),
+        (["-b", "2h", "--agg", "sum:2"], values),
+    ):
+        stdlib = quantize(args, lines, tmp_path, monkeypatch, capsys, chunk_size=2)
+        monkeypatch.setattr(quantize_times, "use_stdlib", lambda *_: False)
+        with_pandas = quantize(args, lines, tmp_path, monkeypatch, capsys, chunk_size=2)
+        monkeypatch.undo()
+        assert stdlib == with_pandas, args
+
+
+def test_stdlib_engine_does_not_import_pandas():
+    program = (
+        "import sys; sys.argv = ['quantize_times.py', '-u', '-b', '1h', '--count']; "
+        "import quantize_times; quantize_times.run(quantize_times.parse_args()); "
+        "print('pandas' in sys.modules)"
+    )
+
+    result = check_output([sys.executable, "-c", program], input=b"1722633512\n", cwd="../bin")
+
+    assert result.decode().splitlines() == ["2024-08-02 21:00:00\t1", "False"]
+
+
+def test_calendar_buckets(tmp_path, monkeypatch, capsys):
+    lines = ["2024-02-29 10:00:00", "2024-03-01 00:00:00", "2024-03-03 23:59:59", "2024-03-04 00:00:00"]
+
+    months = quantize(["-b", "MS"], lines, tmp_path, monkeypatch, capsys)
+    weeks = quantize(["-b", "W"], lines, tmp_path, monkeypatch, capsys)
+
+    assert months == ["2024-02-01 00:00:00", "2024-03-01 00:00:00", "2024-03-01 00:00:00", "2024-03-01 00:00:00"]
+    # weeks end on sunday
+    assert weeks == ["2024-02-25 00:00:00", "2024-02-25 00:00:00", "2024-03-03 00:00:00", "2024-03-03 00:00:00"]
+
+
+def test_old_bucket_aliases_work_for_both_engines(tmp_path, monkeypatch, capsys):
+    us = quantize(["-b", "4H"], ["08/01/2024 07:08:30 AM"], tmp_path, monkeypatch, capsys)
+    iso = quantize(["-b", "4H"], ["2024-08-01T07:08:30"], tmp_path, monkeypatch, capsys)
+
+    assert us == iso == ["2024-08-01 04:00:00"]
+    assert quantize_times.bucket_frequency("30T") == "30min"
+    assert quantize_times.bucket_frequency("MS") == "MS"
+
+
+def test_buckets_are_written_like_timestamps(tmp_path, monkeypatch, capsys):
+    fractions = ["2024-01-01 23:59:59.500", "2024-01-01 23:59:59.650", "2024-01-02 00:00:00", ""]
+    offsets = ["2024-03-10T01:10:00-05:00", "2024-03-10T03:50:00-04:00", "2024-03-10T04:00:00Z"]
+
+    sub_second = quantize(["-b", "100ms"], fractions, tmp_path, monkeypatch, capsys)
+    counts = quantize(["-b", "500ms", "--count"], fractions[:3], tmp_path, monkeypatch, capsys)
+    hours = quantize(["-b", "1h"], offsets, tmp_path, monkeypatch, capsys)
+    monkeypatch.setattr(quantize_times, "use_stdlib", lambda *_: False)
+    # pandas only takes one offset per chunk
+    with_pandas = quantize(["-b", "1h"], offsets[1:2], tmp_path, monkeypatch, capsys)
+
+    assert sub_second == ["2024-01-01 23:59:59.500000", "2024-01-01 23:59:59.600000", "2024-01-02 00:00:00", "NaT"]
+    assert counts == ["2024-01-01 23:59:59.500000\t2", "2024-01-02 00:00:00\t1"]
+    assert hours == ["2024-03-10 01:00:00-05:00", "2024-03-10 03:00:00-04:00", "2024-03-10 04:00:00+00:00"]
+    assert hours == [str(pd.Timestamp(time).floor("1h")) for time in offsets]
+    assert with_pandas == hours[1:2]
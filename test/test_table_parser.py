@@ -0,0 +1,15 @@
+#!/usr/bin/env pytest
+
+from utils import get_cmd, run_and_check
+
+TABLE_PARSER = get_cmd("table-parser.py")
+
+
+def test_001_infer_types():
+    results = run_and_check([TABLE_PARSER, "-i", "--sample", "3"], "table_parser_001")
+    assert results["actual"] == results["expected"]
+
+
+def test_002_long_table_output():
+    results = run_and_check([TABLE_PARSER, "-t"], "table_parser_002")
+    assert results["actual"] == results["expected"]
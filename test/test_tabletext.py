@@ -0,0 +1,85 @@
+#!/usr/bin/env pytest
+
+import sys
+
+sys.path.append("../bin")
+import tabletext
+
+LOG = """\
+starting job
++------+----------+
+| date |   name   |
++------+----------+
+| 2014 |   Jud    |
++------+----------+
++----------+---------+
+|day       |dayOfWeek|
++----------+---------+
+|2023-05-25|  Fri    |
++----------+---------+
+only showing top 1 row
+
+ id | name  | n
+----+-------+---
+  1 | foo   | 3
+ 22 | bar b |
+(2 rows)
+
+| a | b |
+|---|:-:|
+| 1 | x |
+
+name      age
+------  -----
+joe        31
+
++-----+-----+
+| a   | b   |
++=====+=====+
+| 1   | 2   |
++-----+-----+
+| 3   | 4   |
++-----+-----+
+"""
+
+
+def read_all(text, **kwargs):
+    tables = tabletext.read_tables(text.splitlines(keepends=True), **kwargs)
+    return [(t.layout, t.header, list(t.rows)) for t in tables]
+
+
+def test_reads_every_layout_in_one_pass():
+    assert read_all(LOG) == [
+        ("psql", ["date", "name"], [["2014", "Jud"]]),
+        ("spark", ["day", "dayOfWeek"], [["2023-05-25", "Fri"]]),
+        ("psql-aligned", ["id", "name", "n"], [["1", "foo", "3"], ["22", "bar b", ""]]),
+        ("markdown", ["a", "b"], [["1", "x"]]),
+        ("simple", ["name", "age"], [["joe", "31"]]),
+        ("grid", ["a", "b"], [["1", "2"], ["3", "4"]]),
+    ]
+
+
+def test_unread_rows_are_skipped():
+    tables = tabletext.read_tables(LOG.splitlines(keepends=True))
+
+    layouts = [table.layout for table in tables]
+
+    assert layouts == ["psql", "spark", "psql-aligned", "markdown", "simple", "grid"]
+
+
+def test_bulk_and_strip():
+    per_line = read_all(LOG, strip=str.rstrip)
+    bulk = read_all(LOG, strip=str.rstrip, bulk=True)
+
+    assert bulk == per_line
+    assert per_line[1][2] == [["2023-05-25", "  Fri"]]
+
+
+def test_logs_each_table_once_and_a_count_of_other_lines(caplog):
+    caplog.set_level("DEBUG")
+
+    read_all("".join(f"log line {n}\n" for n in range(1000)) + LOG)
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert len(messages) == 7
+    assert messages[-1] == "skipped 1006 lines outside tables"
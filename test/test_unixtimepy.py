@@ -92,3 +92,93 @@ def test_filter_input(capsys):
     result = int(capsys.readouterr().out.strip())
     assert result >= start_timestamp
     assert result <= end_timestamp
+
+def test_parse_date_tries_the_last_pattern_first():
+    parser = unixtime.UnixTimeParser()
+    ctime = 'Sun Sep 27 11:55:28 2020'
+
+    first = parser.parse_date(ctime)
+
+    assert parser.last_pattern == '%a %b %d %H:%M:%S %Y'
+    assert parser.parse_date('Sun Sep 27 11:55:29 2020') == str(int(first) + 1)
+    expected = str(int(datetime(2020, 9, 27, 11, 45, 31).timestamp()))
+    assert parser.parse_date('2020-09-27 11:45:31') == expected
+    assert parser.last_pattern == '%Y-%m-%d %H:%M:%S'
+
+def test_format_datetime_caches_whole_seconds():
+    parser = unixtime.UnixTimeParser()
+
+    result = parser.parse_digits("1601172070400")
+    parser.parse_digits("1601172070999")
+    parser.parse_digits("1601172070")
+
+    assert result == parser.format_datetime(1601172070)
+    assert parser.format_seconds.cache_info().hits >= 2
+
+def test_filter_line_converts_every_epoch():
+    parser = unixtime.UnixTimeParser()
+    line = '{"start": 1601172064, "end": 1601172070400}\n'
+
+    result = parser.filter_line(line)
+
+    expected = '{"start": %s, "end": %s}\n' % (
+        parser.parse_digits("1601172064"), parser.parse_digits("1601172070400"))
+    assert result == expected
+
+def test_filter_block_matches_filter_line():
+    lines = [
+        '{"start": 1601172064, "end": 1601172070400, "n": 42}\n',
+        "no epochs here\n",
+        "1601172064 1601172064 1601149440\n",
+        " 2020-09-26T19:44:00-0000 \n",
+    ]
+    for tz_output in [unixtime.OFFSET, unixtime.UTC, unixtime.LOCALIZED]:
+        parser = unixtime.UnixTimeParser(tz_output)
+
+        result = parser.filter_block(lines)
+
+        assert result == [parser.filter_line(line) for line in lines]
+
+def test_unparsed_lines_are_reported_on_stderr(capsys):
+    parser = unixtime.UnixTimeParser()
+    lines = ["not a date\n", "1601172064\n", "also not a date\n"]
+
+    result = parser.filter_block(lines)
+
+    assert result[0] == lines[0] and result[2] == lines[2]
+    assert capsys.readouterr().out == ""
+
+def test_zone_offsets_match_the_zone_across_dst():
+    from zoneinfo import ZoneInfo
+
+    # New York moves an hour, Lord Howe half an hour
+    for name in ["America/New_York", "Australia/Lord_Howe"]:
+        zone = ZoneInfo(name)
+        offsets = unixtime.ZoneOffsets(zone)
+
+        def check(seconds):
+            local = datetime.fromtimestamp(seconds, zone)
+            expected = (int(local.utcoffset().total_seconds()), local.strftime(" %z"))
+            assert offsets.lookup(seconds) == expected, (name, seconds)
+
+        # every 7 hours over two years, from the middle, so the table grows
+        # both ways, and a far off id that isn't added to it
+        start = 1704067200
+        times = [start + 7 * 3600 * n for n in range(2 * 365 * 24 // 7)]
+        for seconds in times[len(times) // 2:] + times[:len(times) // 2] + [51381234567]:
+            check(seconds)
+        assert offsets.hi < 2 * 10**9
+        # the seconds either side of each change
+        changes = sum(a != b for a, b in zip(offsets.offsets, offsets.offsets[1:]))
+        assert changes >= 4
+        for changed in offsets.starts[1:]:
+            check(changed - 1)
+            check(changed)
+
+def test_zone_offsets_of_a_fixed_zone_need_no_table():
+    from datetime import timedelta, timezone
+
+    offsets = unixtime.ZoneOffsets(timezone(timedelta(hours=5, minutes=30)))
+
+    assert offsets.lookup(51381234567) == (19800, " +0530")
+    assert offsets.starts == []
@@ -0,0 +1,123 @@
+#!/usr/bin/env pytest
+
+import sys
+import tarfile
+import zipfile
+
+import tabulate
+
+sys.path.append("../bin")
+import untabulate
+
+HEADERS = ["date", "name", "address"]
+ROWS = [
+    ["2014", "Jud", "217 main Street"],
+    ["1492", "Columbus", "America"],
+    ["", "", ""],
+    ["2023", "", ""],
+    ["1789", "Zoë", "Paris"],
+    ["2024", "東京", "日本"],
+    ["0042", "1.50", "   padded   "],
+    ["2020", "tab\there", "x"],
+    ["short"],
+]
+
+TABLES = """\
++------+----------+
+| date |   name   |
++------+----------+
+| 2014 |   Jud    |
+| 1492 | Columbus |
++------+----------+
+not a table
++----+
+| id |
++----+
+| 7  |
++----+
+"""
+
+
+def tabulated(headers, row):
+    return tabulate.tabulate(
+        list(zip(headers, row)), tablefmt="simple", numalign=None, disable_numparse=True
+    )
+
+
+def test_long_formatter_matches_tabulate():
+    format_row = untabulate.long_formatter(HEADERS, "simple")
+
+    for row in ROWS:
+        assert format_row(row) == tabulated(HEADERS, row), row
+    assert untabulate.long_formatter([], "simple")([]) == tabulated([], [])
+    assert untabulate.long_formatter(["Zoë", "b"], "simple")(["1", "2"]) == tabulated(["Zoë", "b"], ["1", "2"])
+
+
+def test_long_formatter_other_formats_use_tabulate():
+    format_row = untabulate.long_formatter(HEADERS, "grid")
+
+    assert format_row(ROWS[0]) == tabulate.tabulate(
+        list(zip(HEADERS, ROWS[0])), tablefmt="grid", numalign=None, disable_numparse=True
+    )
+
+
+def expected_members():
+    format_row = untabulate.long_formatter(HEADERS, "simple")
+    return {f"{i + 1:02}": format_row(row) + "\n" for i, row in enumerate(ROWS)}
+
+
+def test_tar_archive(tmp_path):
+    archive = tmp_path / "rows.tgz"
+
+    untabulate.write_archive([HEADERS, *ROWS], "simple", str(archive))
+
+    with tarfile.open(archive, "r:gz") as tf:
+        members = {m.name: tf.extractfile(m).read().decode() for m in tf.getmembers()}
+    assert list(members) == [f"{n:02}" for n in range(1, len(ROWS) + 1)]
+    assert members == expected_members()
+
+
+def test_zip_archive(tmp_path):
+    archive = tmp_path / "rows.zip"
+
+    untabulate.write_archive([HEADERS, *ROWS], "simple", str(archive))
+
+    with zipfile.ZipFile(archive) as zf:
+        members = {name: zf.read(name).decode() for name in zf.namelist()}
+        assert {info.compress_type for info in zf.infolist()} == {zipfile.ZIP_DEFLATED}
+    assert members == expected_members()
+
+
+def test_uncompressed_tar_archive(tmp_path):
+    archive = tmp_path / "rows.tar"
+
+    untabulate.write_archive([HEADERS, *ROWS[:2]], "simple", str(archive))
+
+    with tarfile.open(archive, "r:") as tf:
+        assert tf.getnames() == ["01", "02"]
+
+
+def test_one_row_per_file(tmp_path):
+    # more rows than the threads keep pending
+    rows = [[str(n), f"name {n}", "x" * n] for n in range(40)]
+    format_row = untabulate.long_formatter(HEADERS, "simple")
+
+    untabulate.write_one_row_per_file([HEADERS, *rows], "simple", tmp_path, threads=2)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [f"{n:02}" for n in range(1, 41)]
+    for n, row in enumerate(rows):
+        assert (tmp_path / f"{n + 1:02}").read_text() == format_row(row) + "\n"
+
+
+def test_split_writes_a_file_per_table(tmp_path, monkeypatch):
+    source = tmp_path / "tables.txt"
+    source.write_text(TABLES)
+    out = tmp_path / "out"
+    out.mkdir()
+    monkeypatch.setattr(sys, "argv", ["untabulate.py", "--split", str(out), str(source)])
+
+    untabulate.run(untabulate.parse_args())
+
+    assert sorted(path.name for path in out.iterdir()) == ["01.csv", "02.csv"]
+    assert (out / "01.csv").read_text() == "date,name\n2014,Jud\n1492,Columbus\n"
+    assert (out / "02.csv").read_text() == "id\n7\n"